@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class DateCursorPagination(CursorPagination):
+    '''keyset pages over the fixture kick off, stable while rows are added'''
+    ordering = ('date', 'id')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
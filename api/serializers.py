@@ -1,7 +1,20 @@
 from rest_framework import serializers
+from extractor.poisson_np import PROB_COLUMNS
 from extractor.models import Country, League, Team, Venue, Fixture, Odds, Bet, BookMaker, Season, UserBets, UserBetItems
 
 
+class SparseFieldsMixin:
+    '''keeps only the fields listed in the ``?fields=`` query param'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request else None
+        if fields:
+            for name in set(self.fields) - set(fields.split(',')):
+                self.fields.pop(name)
+
+
 class CountrySerializer(serializers.ModelSerializer):
     class Meta:
         model = Country
@@ -32,7 +45,7 @@ class VenueSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class FixtureSerializer(serializers.ModelSerializer):
+class FixtureSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     home_team = TeamSerializer()
     away_team = TeamSerializer()
     venue = VenueSerializer()
@@ -41,7 +54,13 @@ class FixtureSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class OddSerializer(serializers.ModelSerializer):
+class FixtureCompactSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Fixture
+        fields = '__all__'
+
+
+class OddSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Odds
         fields = '__all__'
@@ -70,4 +89,42 @@ class UserBetItemsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserBetItems
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+
+class ModelFilterSerializer(serializers.Serializer):
+    league = serializers.IntegerField(required=False)
+    bookmaker = serializers.IntegerField(required=False)
+    date_from = serializers.DateTimeField(required=False)
+    date_to = serializers.DateTimeField(required=False)
+
+
+class PredictionSerializer(SparseFieldsMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    date = serializers.DateTimeField()
+    league = serializers.IntegerField(source='league_id')
+    home_team = serializers.IntegerField(source='home_team_id')
+    away_team = serializers.IntegerField(source='away_team_id')
+    l_expected = serializers.FloatField()
+    v_expected = serializers.FloatField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields.update({column: serializers.FloatField() for column in PROB_COLUMNS})
+        return fields
+
+
+class ValueBetSerializer(SparseFieldsMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    fixture = serializers.IntegerField()
+    date = serializers.DateTimeField()
+    league = serializers.CharField()
+    home = serializers.CharField()
+    away = serializers.CharField()
+    bookmaker = serializers.CharField()
+    bet = serializers.CharField()
+    key = serializers.CharField()
+    prob_name = serializers.CharField()
+    value = serializers.FloatField()
+    prob = serializers.FloatField()
+    kelly = serializers.FloatField()
@@ -14,6 +14,9 @@ router.register(r'bookmaker', viewsets.BookmakerViewSet)
 router.register(r'bet', viewsets.BetViewSet)
 router.register(r'userbets', viewsets.UsetBetsViewSet)
 router.register(r'userbetitems', viewsets.UsetBetItemsViewSet)
+router.register(r'prediction', viewsets.PredictionViewSet, basename='prediction')
+router.register(r'valuebet', viewsets.ValueBetViewSet, basename='valuebet')
+router.register(r'sync', viewsets.SyncProgressViewSet, basename='sync')
 
 urlpatterns = [
     path('', include(router.urls)),
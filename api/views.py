@@ -1,33 +1,72 @@
-from rest_framework import viewsets
+from rest_framework import mixins, viewsets
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from api.pagination import DateCursorPagination
 from api.serializers import (CountrySerializer, LeagueSerializer, FixtureSerializer, TeamSerializer,
-                             OddSerializer, BookmakerSerializer, BetSerializer, UserBetsSerializer,
-                             UserBetItemsSerializer)
+                             FixtureCompactSerializer, OddSerializer, BookmakerSerializer, BetSerializer, UserBetsSerializer,
+                             UserBetItemsSerializer, ModelFilterSerializer, PredictionSerializer,
+                             ValueBetSerializer)
 from extractor.models import Country, League, Team, Fixture, Odds, BookMaker, Bet, UserBets, UserBetItems
+from extractor.cache import cached
+from extractor.poisson_f import PREDICTIONS_MATERIALIZED, kelly_function, poisson_model
+from extractor.tasks import sync_progress
+from django.db.models import F
 from django.utils.timezone import now
 from datetime import timedelta
 
 
-class CountryViewSet(viewsets.ReadOnlyModelViewSet):
+class CachedListMixin:
+    '''list responses served from the versioned query cache, keyed by path and params'''
+
+    def list(self, request, *args, **kwargs):
+        params = '&'.join(f'{k}={v}' for k, v in sorted(request.query_params.items()))
+        data = cached(f'{request.path}?{params}',
+                      lambda: super(CachedListMixin, self).list(request, *args, **kwargs).data)
+        return Response(data)
+
+
+class CompactMixin:
+    '''``?compact=1`` serializes related objects as ids with ``compact_serializer_class``'''
+    compact_serializer_class = None
+
+    def is_compact(self):
+        return self.request.query_params.get('compact', '').lower() in ('1', 'true')
+
+    def get_serializer_class(self):
+        if self.compact_serializer_class and self.is_compact():
+            return self.compact_serializer_class
+        return super().get_serializer_class()
+
+
+class CountryViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Country.objects.filter(sync_on=True)
     serializer_class = CountrySerializer
 
 
-class LeagueViewSet(viewsets.ReadOnlyModelViewSet):
+class LeagueViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = League.objects.filter(sync_on=True)
     serializer_class = LeagueSerializer
 
 
 class TeamViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Team.objects.filter(country__sync_on=True)
+    queryset = Team.objects.filter(country__sync_on=True).select_related('country')
     serializer_class = TeamSerializer
 
 
-class FixtureViewSet(viewsets.ReadOnlyModelViewSet):
+class FixtureViewSet(CachedListMixin, CompactMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Fixture.objects.filter(
         home_team__country__sync_on=True,
-        away_team__country__sync_on=True,
-        date__range=(now(), now() + timedelta(15)))
+        away_team__country__sync_on=True)
     serializer_class = FixtureSerializer
+    compact_serializer_class = FixtureCompactSerializer
+
+    def get_queryset(self):
+        # the window moves with every request, not with the worker start
+        queryset = super().get_queryset().filter(date__range=(now(), now() + timedelta(15)))
+        if self.is_compact():
+            return queryset
+        return queryset.select_related('venue', 'home_team__country', 'away_team__country')
 
 
 class OddViewSet(viewsets.ReadOnlyModelViewSet):
@@ -35,12 +74,12 @@ class OddViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = OddSerializer
 
 
-class BookmakerViewSet(viewsets.ReadOnlyModelViewSet):
+class BookmakerViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = BookMaker.objects.filter(sync_on=True)
     serializer_class = BookmakerSerializer
 
 
-class BetViewSet(viewsets.ReadOnlyModelViewSet):
+class BetViewSet(CachedListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Bet.objects.filter(sync_on=True)
     serializer_class = BetSerializer
 
@@ -52,4 +91,54 @@ class UsetBetsViewSet(viewsets.ModelViewSet):
 
 class UsetBetItemsViewSet(viewsets.ModelViewSet):
     queryset = UserBetItems.objects.filter()
-    serializer_class = UserBetItemsSerializer
\ No newline at end of file
+    serializer_class = UserBetItemsSerializer
+
+
+class ModelOutputMixin:
+    '''
+    Filters of the model endpoints, ``league``, ``bookmaker`` and an inclusive
+    ``date_from`` / ``date_to`` range that defaults to the next days fixtures.
+    '''
+    pagination_class = DateCursorPagination
+
+    def model_filters(self):
+        params = ModelFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+        date_filter = None
+        if 'date_from' in params or 'date_to' in params:
+            date_filter = (params.get('date_from', now()),
+                           params.get('date_to', params.get('date_from', now()) + timedelta(15)))
+        return {'league': params.get('league'), 'bookmaker': params.get('bookmaker'),
+                'date_filter': date_filter}
+
+
+class PredictionViewSet(ModelOutputMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = PredictionSerializer
+
+    def get_queryset(self):
+        filters = self.model_filters()
+        if filters['bookmaker'] is not None:
+            # the model predicts the fixtures, the odds are in valuebet
+            raise ValidationError({'bookmaker': 'predictions do not depend on the bookmaker'})
+        return poisson_model(filters['date_filter'], filters['league'],
+                             materialized=PREDICTIONS_MATERIALIZED)\
+            .annotate(league_id=F('season__league'))
+
+
+class ValueBetViewSet(ModelOutputMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = ValueBetSerializer
+
+    def get_queryset(self):
+        return kelly_function(**self.model_filters())
+
+
+class SyncProgressViewSet(viewsets.ViewSet):
+    '''progress of a sync group, by the id the sync_fixtures and sync_odds tasks return'''
+    permission_classes = [IsAdminUser]
+
+    def retrieve(self, request, pk=None):
+        progress = sync_progress(pk)
+        if progress is None:
+            raise NotFound(f'unknown sync group {pk}')
+        return Response(progress)
@@ -224,6 +224,28 @@ STORAGES ={
     },
 }
 
+# Cache
+# CACHE_URL selects the backend: redis://host:port/db, file:///path/to/dir,
+# empty for the per-process local memory cache used in development and tests
+
+CACHE_URL = os.environ.get('CACHE_URL', '')
+
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+        }}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_URL.removeprefix('file://'),
+        }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'betsports',
+        }}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -244,6 +266,17 @@ MQ_URL = os.environ.get('MQ_URL', '')
 CELERY_BROKER_URL = f'{MQ_URL}'
 DJANGO_CELERY_BEAT_TZ_AWARE = False
 
+# installed in the django_celery_beat tables when beat starts
+POLL_LIVE_SECONDS = int(os.environ.get('POLL_LIVE_SECONDS', 60))
+CELERY_BEAT_SCHEDULE = {
+    'poll-fixtures': {
+        'task': 'extractor.tasks.poll_fixtures',
+        'schedule': POLL_LIVE_SECONDS,
+        # a round left in the queue is replaced by the next one
+        'options': {'expires': POLL_LIVE_SECONDS},
+        },
+    }
+
 BATON = {
     'SITE_HEADER': 'BetSports Administration',
     'SITE_TITLE': 'BetSports Admin',
@@ -0,0 +1,86 @@
+'''
+SQLite backed cache of API-Football responses
+'''
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# path of the cache database, empty to turn the cache off
+API_FOOTBALL_CACHE = os.environ.get('API_FOOTBALL_CACHE', str(settings.BASE_DIR / 'data' / 'api_cache.sqlite3'))
+
+MINUTE, HOUR, DAY = 60, 60 * 60, 24 * 60 * 60
+
+# seconds a response stays fresh, endpoints not listed are never cached.
+# Empty responses are not cached either, statistics come after the match
+CACHE_TTL = {
+    'countries': 7 * DAY,
+    'leagues': DAY,
+    'teams': DAY,
+    'odds/bets': 7 * DAY,
+    'odds/bookmakers': 7 * DAY,
+    'odds/mapping': HOUR,
+    'fixtures': 5 * MINUTE,
+    'fixtures/statistics': DAY,
+    'odds': 30,
+}
+
+
+class ResponseCache:
+    '''
+    Decoded responses keyed by endpoint and params, with the validators
+    (``ETag`` / ``Last-Modified``) needed to revalidate stale entries.
+    '''
+
+    def __init__(self, path: str = API_FOOTBALL_CACHE, ttl: dict | None = None) -> None:
+        self.path = path
+        self.ttl = CACHE_TTL if ttl is None else ttl
+        self.lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, body TEXT, etag TEXT, last_modified TEXT, stored_at REAL)')
+
+    def key(self, api: str, params: dict):
+        return f'{api}?{urlencode(sorted(params.items()))}'
+
+    def cacheable(self, api: str):
+        return api in self.ttl
+
+    def get(self, api: str, params: dict):
+        '''cached entry as a dict with a ``fresh`` flag, or None'''
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT body, etag, last_modified, stored_at FROM responses WHERE key = ?',
+                (self.key(api, params),)).fetchone()
+        if row is None:
+            return None
+        body, etag, last_modified, stored_at = row
+        return {'data': json.loads(body), 'etag': etag, 'last_modified': last_modified,
+                'fresh': time.time() - stored_at < self.ttl.get(api, 0)}
+
+    def set(self, api: str, params: dict, data: dict, etag: str | None = None,
+            last_modified: str | None = None):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (self.key(api, params), json.dumps(data), etag, last_modified, time.time()))
+
+    def touch(self, api: str, params: dict):
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE responses SET stored_at = ? WHERE key = ?',
+                (time.time(), self.key(api, params)))
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM responses')
@@ -1,14 +1,32 @@
-from .api_extractor import ApiExtractor
-from .api_mapper import mapper
+from .api_extractor import FIXTURE_IDS_PER_REQUEST, ApiExtractor
+from .api_mapper import map_all, mapper
 from .api_loader import bulk_create_or_update
+from extractor.odds_history import record_prices
 from extractor.models import (
     BetParameter, Country, League, Season, Team, Stats, Fixture,
     Venue, Fixture, BookMaker, Bet, Odds, OddValues)
-from django.db.utils import IntegrityError
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+from itertools import batched
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# fixtures whose statistics are downloaded and persisted together
+STATS_BATCH_SIZE = int(os.environ.get('STATS_BATCH_SIZE', 50))
+
+# days before and after today requested by a delta sync of the fixtures
+SYNC_PAST_DAYS = int(os.environ.get('SYNC_PAST_DAYS', 3))
+SYNC_AHEAD_DAYS = int(os.environ.get('SYNC_AHEAD_DAYS', 14))
+
+RESULT_FIELDS = ('date', 'status', 'home_goals', 'away_goals')
+# fields written by the fixture loads, the polled ones only touch the live state
+FIXTURE_FIELDS = ['date', 'venue', 'status', 'status_short', 'periods', 'score', 'season',
+                  'home_team', 'away_team', 'home_goals', 'away_goals']
+LIVE_FIELDS = ['date', 'status', 'status_short', 'periods', 'score', 'home_goals', 'away_goals']
+
 def calculate_avg(fixture):
     data = {
         'home_favor_goals_avg': fixture.f_home_favor_goals_avg,
@@ -24,162 +42,317 @@ def calculate_avg(fixture):
     Fixture.objects.filter(id=fixture.id).update(**data)
 
 
+def changed_results(models, fields=RESULT_FIELDS):
+    '''
+    Fixtures that are new or differ from the stored row in any of ``fields``,
+    and the earliest date (before or after the change) touched by the ones
+    whose result, status or kick off changed.
+    '''
+    fields = [Fixture._meta.get_field(field) for field in dict.fromkeys((*RESULT_FIELDS, *fields))]
+    stored = {pk: values for pk, *values in Fixture.objects
+              .filter(pk__in=[model.pk for model in models])
+              .values_list('pk', *[field.attname for field in fields])}
+    results = len(RESULT_FIELDS)
+    changed, since = [], None
+    for model in models:
+        values = stored.get(model.pk)
+        incoming = [field.to_python(getattr(model, field.attname)) for field in fields]
+        if values == incoming:
+            continue
+        changed.append(model.pk)
+        if values and values[:results] == incoming[:results]:
+            continue
+        dates = [incoming[0], values[0]] if values else [incoming[0]]
+        since = min([since, *dates] if since else dates)
+    return changed, since
+
+
 class ApiFootball:
 
-    def __init__(self):
-        self.api = ApiExtractor()
+    def __init__(self, cache: bool = True):
+        self.api = ApiExtractor(cache)
 
     def get_countries(self):
         response = self.api.get_countries()
-        models = [mapper(Country, data) for data in response.get('response', [])]
-        return {'country': bulk_create_or_update(Country, models)}
+        models = map_all(Country, response.get('response', []))
+        return {'country': bulk_create_or_update(Country, models, ['name', 'flag'])}
 
     def get_leagues(self, country_code):
         response = self.api.get_leagues(country_code)
-        league_models = []
+        league_models = map_all(League, response.get('response', []))
         season_models = []
-        for league_ in response.get('response', []):
-            league_models.append(mapper(League, league_))
-            season_league_models = []
+        for league_, league_model in zip(response.get('response', []), league_models):
             for season_ in league_['seasons']:
                 season_model = mapper(Season, season_,
                                       id=f'{league_["league"]["id"]}-{season_["year"]}')
-                season_model.league = league_models[-1]
-                season_league_models.append(season_model)
-
-            season_models.extend(season_league_models)
-        return {'league': bulk_create_or_update(League, league_models),
-                'season': bulk_create_or_update(Season, season_models)}
+                season_model.league = league_model
+                season_models.append(season_model)
+        return {'league': bulk_create_or_update(
+                    League, league_models, ['name', 'type', 'logo', 'country']),
+                'season': bulk_create_or_update(
+                    Season, season_models, ['year', 'start', 'end', 'current', 'coverage'])}
 
     def get_teams(self, league):
         season = Season.objects.filter(league=league, current=True).first()
         response = self.api.get_teams(league, season.year)
-        for data in response.get('response', []):
-            model = mapper(Venue, data)
-            try:
-                model.save()
-                venue = {'venue': Venue.objects.get(id=data['venue']['id'])}
-            except IntegrityError as e:
-                venue = {}
-                logger.error(f"Error saving Venue: {e}")
-            team_models = [mapper(Team, data, **venue)
-                           for data in response.get('response', [])]
-        return {'team': bulk_create_or_update(Team, team_models)}
-
-    def get_fixtures(self, league):
+        venue_models = map_all(Venue, response.get('response', []))
+        valid = [model for model in venue_models
+                 if None not in (model.id, model.name, model.country_id)]
+        if len(valid) < len(venue_models):
+            logger.error(f'{len(venue_models) - len(valid)} venues without id, name or country skipped')
+        venues = bulk_create_or_update(
+            Venue, valid,
+            ['name', 'address', 'city', 'country', 'capacity', 'surface', 'image'])
+        team_models = map_all(Team, response.get('response', []))
+        return {'venue': venues, 'team': bulk_create_or_update(
+            Team, team_models,
+            ['name', 'code', 'country', 'founded', 'national', 'logo', 'venue'])}
+
+    def get_fixtures(self, league, backfill=False):
+        '''
+        Fixtures of the current season of a league. Only the window that can
+        have changed is requested, SYNC_PAST_DAYS back to SYNC_AHEAD_DAYS
+        ahead, unless ``backfill`` is set or the season has no fixtures yet.
+        Only new and changed fixtures are handed to the loader.
+        '''
         season = Season.objects.filter(league=league, current=True).first()
-        response = self.api.get_fixtures(league, season.year)
-        models = []
-        for data in response.get('response', []):
-            model = mapper(Fixture, data)
-            model.season = Season.objects.get(id=f'{data["league"]["id"]}-{season.year}')
-            models.append(model)
+        window = {}
+        if not backfill and Fixture.objects.filter(season=season).exists():
+            today = timezone.now().date()
+            window = {'from': (today - timedelta(days=SYNC_PAST_DAYS)).isoformat(),
+                      'to': (today + timedelta(days=SYNC_AHEAD_DAYS)).isoformat()}
+        response = self.api.get_fixtures(league, season.year, **window)
+        models = map_all(Fixture, response.get('response', []), season=season)
+        for model in models:
+            model.set_status_short()
+
+        changed, since = changed_results(models, FIXTURE_FIELDS)
+        changed = set(changed)
+        result = bulk_create_or_update(
+            Fixture, [model for model in models if model.pk in changed], FIXTURE_FIELDS)
+        result['unchanged'] += len(models) - len(changed)
+        return {**result, 'since': since, 'window': window or None}
 
-        return bulk_create_or_update(
-            Fixture, models,
-            ['date', 'status', 'periods', 'score', 'home_goals', 'away_goals'])
+    def refresh_fixtures(self, ids):
+        '''
+        Kick off, status and score of known fixtures requested by id, in
+        chunks of FIXTURE_IDS_PER_REQUEST ids downloaded concurrently.
+        ``since`` maps every league whose results changed to the earliest
+        date its averages have to be recomputed from.
+        '''
+        responses = self.api.map(self.api.get_fixtures_by_id, batched(ids, FIXTURE_IDS_PER_REQUEST))
+        items = [item for response in responses for item in response.get('response', [])]
+        models = map_all(Fixture, items)
+        leagues = {}
+        for item, model in zip(items, models):
+            model.set_status_short()
+            leagues.setdefault(item['league']['id'], []).append(model)
 
-    def get_fixture_stats(self, league):
+        changed, since = set(), {}
+        for league, league_models in leagues.items():
+            league_changed, league_since = changed_results(league_models, LIVE_FIELDS)
+            changed.update(league_changed)
+            if league_since:
+                since[league] = league_since
+        result = bulk_create_or_update(
+            Fixture, [model for model in models if model.pk in changed], LIVE_FIELDS)
+        result['unchanged'] += len(models) - len(changed)
+        return {**result, 'since': since}
 
+    def iter_fixture_stats(self, league, after=None, backfill=False,
+                           batch_size=STATS_BATCH_SIZE):
+        '''
+        Downloads the statistics of the finished fixtures without them in
+        batches of ``batch_size`` fixtures ordered by id, persisting every
+        batch before the next one. Yields each batch result with ``after``,
+        the checkpoint to resume from. ``backfill`` includes past seasons.
+        '''
         fixtures = Fixture.objects.filter(
             season__league=league,
-            season__current=True,
             stats__isnull=True,
             home_goals__isnull=False,
             away_goals__isnull=False
+            ).order_by('id')
+        if not backfill:
+            fixtures = fixtures.filter(season__current=True)
+        while True:
+            batch = list(fixtures.filter(id__gt=after)[:batch_size] if after is not None
+                         else fixtures[:batch_size])
+            if not batch:
+                return
+            responses = self.api.map(lambda fixture: self.api.get_fixture_stats(fixture.id), batch)
+            models = [self.map_stats(fixture, response.get('response', {}))
+                      for fixture, response in zip(batch, responses)]
+            result = bulk_create_or_update(Stats, [model for model in models if model])
+            after = batch[-1].id
+            yield {**result, 'fixtures': len(batch), 'after': after}
+
+    def get_fixture_stats(self, league, after=None, backfill=False, batch_size=STATS_BATCH_SIZE,
+                          max_batches=None, progress=None):
+        '''
+        Runs ``iter_fixture_stats`` for at most ``max_batches`` batches,
+        calling ``progress`` with the running totals after every batch. The
+        returned ``after`` is None once every fixture has been requested.
+        '''
+        total = {'fixtures': 0, 'create': 0, 'update': 0, 'after': None}
+        batches = self.iter_fixture_stats(league, after, backfill, batch_size)
+        for number, result in enumerate(batches, 1):
+            total['fixtures'] += result['fixtures']
+            total['create'] += result['create']
+            total['update'] += result['update']
+            total['after'] = result['after']
+            logger.info(f'league {league}: stats of {total["fixtures"]} fixtures, '
+                        f'checkpoint {result["after"]}')
+            if progress:
+                progress(total)
+            if max_batches and number >= max_batches:
+                return total
+        total['after'] = None
+        return total
+
+    def map_stats(self, fixture, response_):
+        if response_:
+            home_team = fixture.home_team_id
+            response_ = {x['team']['id']: x['statistics'] for x in response_}
+            response = {'home': {}, 'away': {}}
+            for team, stats in response_.items():
+                team = 'home' if int(team) == home_team else 'away'
+                response[team] = {stat['type']: stat['value'] for stat in stats}
+            model = Stats(
+                fixture=fixture,
+                home_shots_on_goal=response['home'].get("Shots on Goal"),
+                away_shots_on_goal=response['away'].get("Shots on Goal"),
+                home_shots_off_goal=response['home'].get("Shots off Goal"),
+                away_shots_off_goal=response['away'].get("Shots off Goal"),
+                home_total_shots=response['home'].get("Total Shots"),
+                away_total_shots=response['away'].get("Total Shots"),
+                home_blocked_shots=response['home'].get("Blocked Shots"),
+                away_blocked_shots=response['away'].get("Blocked Shots" ),
+                home_shots_inside_box=response['home'].get("Shots insidebox"),
+                away_shots_inside_box=response['away'].get("Shots insidebox"),
+                home_shots_outside_box=response['home'].get("Shots outsidebox"),
+                away_shots_outside_box=response['away'].get("Shots outsidebox"),
+                home_fouls=response['home'].get("Fouls"),
+                away_fouls=response['away'].get("Fouls"),
+                home_corners=response['home'].get("Corner Kicks"),
+                away_corners=response['away'].get("Corner Kicks"),
+                home_offsides=response['home'].get("Offsides"),
+                away_offsides=response['away'].get("Offsides"),
+                home_yellow_cards=response['home'].get("Yellow Cards"),
+                away_yellow_cards=response['away'].get("Yellow Cards"),
+                home_red_cards=response['home'].get("Red Cards"),
+                away_red_cards=response['away'].get("Red Cards"),
+                home_ball_possession=float(response['home'].get("Ball Possession", '').replace('%', '')) / 100\
+                    if response['home'].get("Ball Possession") else None,
+                away_ball_possession=float(response['away'].get("Ball Possession", '').replace('%', '')) / 100\
+                    if response['away'].get("Ball Possession") else None,
+                home_goalkeeper_saves=response['home'].get("Goalkeeper Saves"),
+                away_goalkeeper_saves=response['away'].get("Goalkeeper Saves"),
+                home_total_passes=response['home'].get("Total Passes"),
+                away_total_passes=response['away'].get("Total Passes"),
+                home_passes_accurate=response['home'].get("Passes accurate"),
+                away_passes_accurate=response['away'].get("Passes accurate")
             )
-        models = []
-        for fixture in fixtures:
-            home_team = fixture.home_team.id
-            response_ = self.api.get_fixture_stats(fixture.id).get('response', {})
-            if response_:
-                response_ = {x['team']['id']: x['statistics'] for x in response_}
-                response = {'home': {}, 'away': {}}
-                for team, stats in response_.items():
-                    team = 'home' if int(team) == home_team else 'away'
-                    response[team] = {stat['type']: stat['value'] for stat in stats}
-                model = Stats(
-                    fixture=fixture,
-                    home_shots_on_goal=response['home'].get("Shots on Goal"),
-                    away_shots_on_goal=response['away'].get("Shots on Goal"),
-                    home_shots_off_goal=response['home'].get("Shots off Goal"),
-                    away_shots_off_goal=response['away'].get("Shots off Goal"),
-                    home_total_shots=response['home'].get("Total Shots"),
-                    away_total_shots=response['away'].get("Total Shots"),
-                    home_blocked_shots=response['home'].get("Blocked Shots"),
-                    away_blocked_shots=response['away'].get("Blocked Shots" ),
-                    home_shots_inside_box=response['home'].get("Shots insidebox"),
-                    away_shots_inside_box=response['away'].get("Shots insidebox"),
-                    home_shots_outside_box=response['home'].get("Shots outsidebox"),
-                    away_shots_outside_box=response['away'].get("Shots outsidebox"),
-                    home_fouls=response['home'].get("Fouls"),
-                    away_fouls=response['away'].get("Fouls"),
-                    home_corners=response['home'].get("Corner Kicks"),
-                    away_corners=response['away'].get("Corner Kicks"),
-                    home_offsides=response['home'].get("Offsides"),
-                    away_offsides=response['away'].get("Offsides"),
-                    home_yellow_cards=response['home'].get("Yellow Cards"),
-                    away_yellow_cards=response['away'].get("Yellow Cards"),
-                    home_red_cards=response['home'].get("Red Cards"),
-                    away_red_cards=response['away'].get("Red Cards"),
-                    home_ball_possession=float(response['home'].get("Ball Possession", '').replace('%', '')) / 100\
-                        if response['home'].get("Ball Possession") else None,
-                    away_ball_possession=float(response['away'].get("Ball Possession", '').replace('%', '')) / 100\
-                        if response['away'].get("Ball Possession") else None,
-                    home_goalkeeper_saves=response['home'].get("Goalkeeper Saves"),
-                    away_goalkeeper_saves=response['away'].get("Goalkeeper Saves"),
-                    home_total_passes=response['home'].get("Total Passes"),
-                    away_total_passes=response['away'].get("Total Passes"),
-                    home_passes_accurate=response['home'].get("Passes accurate"),
-                    away_passes_accurate=response['away'].get("Passes accurate")
-                )
-                models.append(model)
-
-        return bulk_create_or_update(Stats, models)
-
-
-    def get_odds(self, league, season, bookmaker):
+            return model
+
+
+    def get_odds(self, league, season, bookmaker, progress=None):
+        '''
+        streams the odds of a season page by page, one transaction per page,
+        calling ``progress`` with the running totals after every page
+        '''
         season = int(season.split('-')[-1])
-        response = self.api.get_odds(league, season, bookmaker)['response']
-        bet_catalog = BetParameter.objects.all()
-
-        for fixture in response:
-            for bookmaker in fixture['bookmakers']:
-                for bet in bookmaker['bets']:
-                    if Fixture.objects.filter(id=fixture['fixture']['id']).exists():
-                        odd = Odds(
-                            id=f'{bookmaker["id"]}-{bet["id"]}-{fixture["fixture"]["id"]}',
-                            bookmaker=BookMaker.objects.get(id=bookmaker['id']),
-                            bet=Bet.objects.get(id=bet['id']),
-                            fixture=Fixture.objects.get(id=fixture['fixture']['id'])
-                            )
-                        if odd.bookmaker and odd.bet and odd.fixture:
-                            try:
-                                odd.save()
-                            except IntegrityError as e:
-                                logger.warning(e)
-                            for value in bet['values']:
-                                prob_name = bet_catalog.filter(bet=odd.bet, key=value['value']).first().prob_name\
-                                    if bet_catalog.filter(bet=odd.bet, key=value['value']).exists() else ''
-                                odd_value = OddValues(
-                                    id=f'{odd}-{value["value"]}',
-                                    odd=odd,
-                                    key=value['value'],
-                                    value=value['odd'],
-                                    prob_name=prob_name
-                                    )
-                                try:
-                                    odd_value.save()
-                                except IntegrityError as e:
-                                    logger.warning(e)
-        return response
+        result = {'pages': 0, 'odds': 0, 'values': 0, 'history': 0}
+        for page in self.api.iter_odds(league, season, bookmaker):
+            loaded = self.load_odds(page.get('response', []))
+            result['pages'] += 1
+            result['odds'] += loaded['odds']['create'] + loaded['odds']['update']
+            result['values'] += loaded['values']['create'] + loaded['values']['update']
+            result['history'] += loaded['history']
+            if progress:
+                progress(result)
+        return result
+
+    def get_fixture_odds(self, fixtures, bookmakers=None):
+        '''
+        odds of the fixtures in ``fixtures``, a mapping of ``(league, season
+        year, date)`` to the fixture ids wanted that day. One paged request
+        per league and day brings every bookmaker, only ``bookmakers`` are
+        loaded. Days are downloaded concurrently and loaded as they arrive.
+        '''
+        responses = self.api.map(lambda day: self.api.get_date_odds(*day), fixtures)
+        result = {'requests': 0, 'odds': 0, 'values': 0, 'history': 0}
+        for wanted, response in zip(fixtures.values(), responses):
+            loaded = self.load_odds([item for item in response.get('response', [])
+                                     if item['fixture']['id'] in wanted], bookmakers)
+            result['requests'] += (response.get('paging') or {}).get('total', 1)
+            result['odds'] += loaded['odds']['create'] + loaded['odds']['update']
+            result['values'] += loaded['values']['create'] + loaded['values']['update']
+            result['history'] += loaded['history']
+        return result
+
+    def load_odds(self, response, bookmakers=None):
+        '''odds of an odds response, of every known bookmaker or of ``bookmakers``'''
+        # the fixtures of the response and the keys of their stored odds
+        rows = Fixture.objects.filter(id__in={item['fixture']['id'] for item in response})\
+            .values_list('id', 'odds__bookmaker', 'odds__bet', 'odds__id')
+        fixtures, ids = set(), {}
+        for fixture, bookmaker, bet, pk in rows:
+            fixtures.add(fixture)
+            if pk is not None:
+                ids[fixture, bookmaker, bet] = pk
+        known = BookMaker.objects.in_bulk(bookmakers)
+        bets = Bet.objects.in_bulk()
+        catalog = {(bet, key): prob_name for bet, key, prob_name
+                   in BetParameter.objects.values_list('bet', 'key', 'prob_name')}
+
+        odds, values = {}, []
+        for item in response:
+            fixture = item['fixture']['id']
+            if fixture not in fixtures:
+                continue
+            for bookmaker_ in item['bookmakers']:
+                bookmaker = known.get(bookmaker_['id'])
+                if bookmaker is None:
+                    if bookmakers is None:
+                        logger.warning(f'unknown bookmaker {bookmaker_["id"]}')
+                    continue
+                for bet_ in bookmaker_['bets']:
+                    bet = bets.get(bet_['id'])
+                    if bet is None:
+                        logger.warning(f'unknown bet {bet_["id"]}')
+                        continue
+                    odd = (fixture, bookmaker.id, bet.id)
+                    odds[odd] = Odds(fixture_id=fixture, bookmaker=bookmaker, bet=bet)
+                    for value in bet_['values']:
+                        key = str(value['value'])
+                        values.append((odd, key, value['odd'], catalog.get((bet.id, key), '')))
+
+        with transaction.atomic():
+            # odds have nothing to update, only the missing ones are inserted.
+            # A concurrent load may insert the same ones first, the no-op
+            # update on conflict still returns the surrogate keys
+            created = Odds.objects.bulk_create(
+                [odd for key, odd in odds.items() if key not in ids], update_conflicts=True,
+                unique_fields=['fixture', 'bookmaker', 'bet'], update_fields=['fixture'])
+            ids.update({(odd.fixture_id, odd.bookmaker_id, odd.bet_id): odd.pk for odd in created})
+            values = [OddValues(odd_id=ids[odd], key=key, value=float(value), prob_name=prob_name)
+                      for odd, key, value, prob_name in values]
+            loaded = bulk_create_or_update(OddValues, values, ['value', 'prob_name'],
+                                           unique_fields=['odd', 'key'])
+            # the loader compared the values against the stored ones, only
+            # the new and repriced values get a history row, not a new prob_name
+            changed = set(loaded['changed_fields']['value'])
+            history = record_prices([value for value in values if value.pk in changed])
+            return {'odds': {'create': len(created), 'update': 0, 'unchanged': len(odds) - len(created)},
+                    'values': loaded, 'history': history}
 
     def get_bets(self):
         response = self.api.get_bets()['response']
-        models = [mapper(Bet, data) for data in response if data['name'] is not None]
-        return bulk_create_or_update(Bet, models)
+        models = map_all(Bet, [data for data in response if data['name'] is not None])
+        return bulk_create_or_update(Bet, models, ['name'])
 
     def get_bookmakers(self):
         response = self.api.get_bookmakers()['response']
-        models = [mapper(BookMaker, data) for data in response if data['name'] is not None]
-        return bulk_create_or_update(BookMaker, models)
+        models = map_all(BookMaker, [data for data in response if data['name'] is not None])
+        return bulk_create_or_update(BookMaker, models, ['name'])
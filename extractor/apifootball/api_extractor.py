@@ -4,52 +4,226 @@ API-Football API extractor
 import os
 import requests
 import logging
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from .api_cache import API_FOOTBALL_CACHE, ResponseCache
 
 logger = logging.getLogger(__name__)
 
+# requests per minute allowed by the RapidAPI plan and concurrent connections
+API_FOOTBALL_RATE_LIMIT = float(os.environ.get('API_FOOTBALL_RATE_LIMIT', 120))
+API_FOOTBALL_BURST = int(os.environ.get('API_FOOTBALL_BURST', 1))
+API_FOOTBALL_WORKERS = int(os.environ.get('API_FOOTBALL_WORKERS', 4))
+# largest ``ids`` list accepted by the fixtures endpoint
+FIXTURE_IDS_PER_REQUEST = 20
+
+
+class TokenBucket:
+    '''
+    Blocking token bucket shared by every thread of the process, ``rate``
+    tokens per second up to ``capacity`` tokens.
+    '''
+
+    def __init__(self, rate: float, capacity: int = 1) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # a negative balance books the next free slots for the waiting threads
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class SharedQuota:
+    '''
+    Requests per clock minute counted in the Django cache, shared by every
+    worker process when the cache is. Callers over the quota wait for the
+    next minute.
+    '''
+
+    def __init__(self, per_minute: float, key: str = 'api-football-quota') -> None:
+        self.per_minute = per_minute
+        self.key = key
+
+    def acquire(self):
+        waited = 0.
+        while True:
+            now = time.time()
+            window = f'{self.key}:{int(now // 60)}'
+            cache.add(window, 0, timeout=120)
+            try:
+                count = cache.incr(window)
+            except ValueError:
+                # the window expired between add and incr
+                continue
+            if count <= self.per_minute:
+                return waited
+            wait = 60 - now % 60
+            time.sleep(wait)
+            waited += wait
+
+
+def pooled_session(workers: int = API_FOOTBALL_WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 
 class ApiExtractor:
-    sleep = .5
+    timeout = 30
+    workers = API_FOOTBALL_WORKERS
+    session = pooled_session()
+    # the bucket spaces the requests of a process, the quota caps all of them
+    limiter = TokenBucket(API_FOOTBALL_RATE_LIMIT / 60, API_FOOTBALL_BURST)
+    quota = SharedQuota(API_FOOTBALL_RATE_LIMIT)
 
-    def __init__(self) -> None:
+    def __init__(self, cache: bool = True) -> None:
         self.headers = {
             'x-rapidapi-host': os.environ.get('API_FOOTBALL_HOST'),
             'x-rapidapi-key': os.environ.get('API_FOOTBALL_KEY')
             }
         self.url_base = os.environ.get('API_FOOTBALL_URL')
         self.request_counter = {}
+        self.cache_counter = {}
+        self.cache = ResponseCache(API_FOOTBALL_CACHE) if cache and API_FOOTBALL_CACHE else None
         self.errors = []
         self.response = None
         self.ok = None
+        self.lock = threading.Lock()
 
-    def get(self, api: str, **kwargs):
+    def request(self, api: str, headers: dict | None = None, **kwargs):
         url = f'{self.url_base}{api}'
         logger.info(f'sending request to {api} with params {kwargs}')
-        self.response = requests.get(url, headers=self.headers, params=kwargs)
-        time.sleep(self.sleep)
+        self.limiter.acquire()
+        self.quota.acquire()
+        response = self.session.get(url, headers={**self.headers, **(headers or {})},
+                                    params=kwargs, timeout=self.timeout)
 
-        self.ok = self.response.status_code < 400
-        if self.response.status_code >= 400:
-            logger.error(f'resquest to {url} returns {self.response.status_code}')
+        if response.status_code >= 400:
+            logger.error(f'resquest to {url} returns {response.status_code}')
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        errors = data.get('errors') if isinstance(data, dict) else None
+        with self.lock:
+            self.response = response
+            self.ok = response.status_code < 400
+            if errors:
+                self.errors.extend(errors.values() if isinstance(errors, dict) else errors)
+                logger.error(errors)
+            self.request_counter[api] = self.request_counter.get(api, 0) + 1
+        return response, data
 
-        if self.response.json().get('errors'):
-            self.errors.extend(self.response.json().get('errors', []))
-            logger.error(self.response.json().get('errors', []))
+    def get(self, api: str, **kwargs):
+        return self.request(api, **kwargs)[0]
 
-        self.request_counter[api] = self.request_counter.get(api, 0) + 1
-        return self.response
+    def fetch(self, api: str, **kwargs) -> dict:
+        '''
+        Decoded response, served from the response cache while it is fresh.
+        Stale entries are revalidated with a conditional request.
+        '''
+        if self.cache is None or not self.cache.cacheable(api):
+            return self.request(api, **kwargs)[1]
+
+        cached = self.cache.get(api, kwargs)
+        if cached and cached['fresh']:
+            self._count_cache(api, 'hit')
+            return cached['data']
+
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+        response, data = self.request(api, headers, **kwargs)
+        if cached and response.status_code == 304:
+            self._count_cache(api, 'revalidated')
+            self.cache.touch(api, kwargs)
+            return cached['data']
+
+        self._count_cache(api, 'miss')
+        if response.status_code < 400 and data and data.get('response') and not data.get('errors'):
+            self.cache.set(api, kwargs, data, response.headers.get('ETag'),
+                           response.headers.get('Last-Modified'))
+        return data
+
+    def _count_cache(self, api: str, outcome: str):
+        with self.lock:
+            counter = self.cache_counter.setdefault(api, {'hit': 0, 'miss': 0, 'revalidated': 0})
+            counter[outcome] += 1
+
+    def map(self, fn, items, workers: int | None = None):
+        '''
+        ``fn`` over ``items`` on a bounded thread pool, results in order as
+        they are consumed. At most ``workers`` calls are in flight or waiting
+        to be consumed, and requests stay under the shared rate limiter.
+        '''
+        workers = workers or self.workers
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for item in items:
+                if len(pending) >= workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(fn, item))
+            while pending:
+                yield pending.popleft().result()
+
+    def pages(self, api: str, **kwargs):
+        '''
+        Yields every page of a paginated endpoint following its ``paging``
+        block, downloading the next page while the current one is processed.
+        '''
+        page = self.fetch(api, **kwargs)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            while True:
+                paging = page.get('paging') or {}
+                current, total = paging.get('current', 1), paging.get('total', 1)
+                upcoming = executor.submit(self.fetch, api, **{**kwargs, 'page': current + 1})\
+                    if current < total else None
+                yield page
+                if upcoming is None:
+                    return
+                page = upcoming.result()
+
+    def fetch_all(self, api: str, **kwargs) -> dict:
+        '''every page of a paginated endpoint merged in a single response'''
+        pages = self.pages(api, **kwargs)
+        response = next(pages)
+        for page in pages:
+            response.setdefault('response', []).extend(page.get('response', []))
+            response['errors'] = response.get('errors') or page.get('errors')
+        response['results'] = len(response.get('response', []))
+        return response
 
     def post(self, api: str, **kwargs):
         url = f'{self.url_base}{api}'
-        self.response = requests.post(url, headers=self.headers, json=kwargs)
+        self.limiter.acquire()
+        self.quota.acquire()
+        self.response = self.session.post(url, headers=self.headers, json=kwargs, timeout=self.timeout)
         self.ok = self.response.status_code < 400
 
         if self.response.status_code >= 400:
             logger.error(f'resquest to {url} returns {self.response.status_code}')
-        time.sleep(self.sleep)
-        if 'errors' in self.response.json().keys():
-            self.errors.extend(self.response.json().get('errors').values())
+        data = self.response.json()
+        if 'errors' in data.keys():
+            self.errors.extend(data.get('errors').values())
         return self.response
 
     def __set_empty_pk(self, response, pk_field, secondary_field):
@@ -63,38 +237,50 @@ class ApiExtractor:
         return response
 
     def get_countries(self, **kwargs):
-        response = self.get('countries', **kwargs).json()
+        response = self.fetch('countries', **kwargs)
         return self.__set_empty_pk(response, 'code', 'name')
 
     def get_leagues(self, country_code: str, **kwargs):
-        response = self.get('leagues', code=country_code, **kwargs).json()
+        response = self.fetch('leagues', code=country_code, **kwargs)
         return response
 
     def get_teams(self, league: str, season: str, **kwargs):
-        response = self.get('teams', league=league, season=season, **kwargs).json()
+        response = self.fetch('teams', league=league, season=season, **kwargs)
         return response
 
     def get_fixtures(self, league: int, season: int, **kwargs):
-        response = self.get('fixtures', league=league, season=season, **kwargs).json()
+        response = self.fetch_all('fixtures', league=league, season=season, **kwargs)
+        return response
+
+    def get_fixtures_by_id(self, ids):
+        # the endpoint takes up to FIXTURE_IDS_PER_REQUEST ids joined by '-'
+        response = self.fetch('fixtures', ids='-'.join(str(id) for id in ids))
+        return response
+
+    def get_date_odds(self, league: int, season: int, date: str):
+        response = self.fetch_all('odds', league=league, season=season, date=date)
         return response
 
     def get_fixture_stats(self, fixture: int):
-        response = self.get('fixtures/statistics', fixture=fixture).json()
+        response = self.fetch('fixtures/statistics', fixture=fixture)
         return response
 
     def get_odds(self, league: int, season: int, bookmaker: int):
-        response = self.get('odds', league=league, season=season,
-                            bookmaker=bookmaker).json()
+        response = self.fetch_all('odds', league=league, season=season,
+                                  bookmaker=bookmaker)
         return response
 
+    def iter_odds(self, league: int, season: int, bookmaker: int):
+        return self.pages('odds', league=league, season=season, bookmaker=bookmaker)
+
     def get_mapping(self, **kwargs):
-        response = self.get('odds/mapping', **kwargs).json()
+        response = self.fetch_all('odds/mapping', **kwargs)
         return response
 
     def get_bookmakers(self, **kwargs):
-        response = self.get('odds/bookmakers', **kwargs).json()
+        response = self.fetch('odds/bookmakers', **kwargs)
         return response
 
     def get_bets(self, **kwargs):
-        response = self.get('odds/bets', **kwargs).json()
+        response = self.fetch('odds/bets', **kwargs)
         return response
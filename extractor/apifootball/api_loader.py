@@ -1,23 +1,84 @@
 from django.db.models import Model
-from typing import List
+from itertools import batched
+from time import perf_counter
+from typing import Iterable, List
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+LOADER_CHUNK_SIZE = int(os.environ.get('LOADER_CHUNK_SIZE', 1000))
+LOADER_METRICS = {}
 
-def bulk_create_or_update(model, data: List[Model], update_fields: List[str] | None = None,
-                          batch_size: int = 100):
-    update, create = {}, {}
-    result = {}
-    for item in data:
-        if model.objects.filter(pk=item.pk).exists():
-            update[item.pk] = item
+
+def _key(fields, item):
+    return tuple(field.to_python(getattr(item, field.attname)) for field in fields)
+
+
+def _stored(model, unique, compare, items):
+    '''stored values of ``compare`` for the items already in the table, by unique key'''
+    lookup = {f'{unique[0].name}__in': {_key(unique[:1], item)[0] for item in items}}
+    rows = model.objects.filter(**lookup).values_list(
+        *[field.attname for field in unique], *[field.attname for field in compare])
+    return {tuple(row[:len(unique)]): list(row[len(unique):]) for row in rows}
+
+
+def _record(model, result, elapsed):
+    metrics = LOADER_METRICS.setdefault(model.__name__, {
+        'calls': 0, 'create': 0, 'update': 0, 'unchanged': 0, 'seconds': 0.})
+    metrics['calls'] += 1
+    metrics['seconds'] += elapsed
+    for key in ('create', 'update', 'unchanged'):
+        metrics[key] += result[key]
+
+
+def bulk_create_or_update(model, data: Iterable[Model], update_fields: List[str] | None = None,
+                          batch_size: int = 100, unique_fields: List[str] | None = None,
+                          chunk_size: int = LOADER_CHUNK_SIZE):
+    '''
+    Insert new rows and update ``update_fields`` of existing ones with one
+    ``INSERT ... ON CONFLICT`` per chunk. Rows whose ``update_fields`` are
+    already up to date are not written. Without ``update_fields`` existing
+    rows are left untouched. ``changed`` holds the keys of the rows written
+    and ``changed_fields`` those of each update field written with a new
+    value, all of them for new rows.
+    '''
+    start = perf_counter()
+    unique = [model._meta.get_field(name) for name in unique_fields or [model._meta.pk.name]]
+    compare = [model._meta.get_field(name) for name in update_fields or []]
+    result = {'create': 0, 'update': 0, 'unchanged': 0, 'changed': [],
+              'changed_fields': {field.name: [] for field in compare}}
+    for chunk in batched(data, chunk_size):
+        # the last item wins when the same key comes twice
+        items = {_key(unique, item): item for item in chunk}
+        stored = _stored(model, unique, compare, items.values())
+        create, update, written = [], [], []
+        for key, item in items.items():
+            if key not in stored:
+                create.append(item)
+                written.append((item, compare))
+                continue
+            values = [field.to_python(getattr(item, field.attname)) for field in compare]
+            if stored[key] != values:
+                update.append(item)
+                written.append((item, [field for field, old, new in zip(compare, stored[key], values)
+                                       if old != new]))
+        result['create'] += len(create)
+        result['update'] += len(update)
+        result['unchanged'] += len(items) - len(create) - len(update)
+        if update_fields:
+            model.objects.bulk_create(
+                [*create, *update], batch_size=batch_size, update_conflicts=True,
+                unique_fields=[field.name for field in unique], update_fields=update_fields)
         else:
-            create[item.pk] = item
-    result['create'] = len(model.objects.bulk_create(create.values(), batch_size=batch_size))
-    if update_fields:
-        result['update'] = model.objects.bulk_update(
-            update.values(),
-            update_fields, batch_size=batch_size)
-    logger.info(f'{model.__name__}: {result}')
+            model.objects.bulk_create(create, batch_size=batch_size)
+        # read after the insert, which sets the surrogate keys of the new rows
+        for item, fields in written:
+            result['changed'].append(item.pk)
+            for field in fields:
+                result['changed_fields'][field.name].append(item.pk)
+    result['elapsed'] = perf_counter() - start
+    _record(model, result, result['elapsed'])
+    logger.info(f'{model.__name__}: create={result["create"]} update={result["update"]} '
+                f'unchanged={result["unchanged"]} in {result["elapsed"]:.2f}s')
     return result
@@ -1,5 +1,6 @@
 from django.db import models
-from typing import Sequence, Any
+from functools import cache
+from typing import Any, Iterable, Sequence
 
 MAPPING = {
     'Country': {
@@ -76,24 +77,67 @@ MAPPING = {
 
 
 def deep_get(data: dict, keys: Sequence, default: Any = None):
-    if not data:
-        return default
-    inner = data.get(keys.pop(0), {}) if keys else {}
-    return deep_get(inner, keys, default) if keys else inner
+    for key in keys:
+        if not isinstance(data, dict) or key not in data:
+            return default
+        data = data[key]
+    return data
 
 
-def mapper(model: models.Model, data: dict, **kwargs):
-    mapper = MAPPING.get(model.__name__)
-    mapped = {**kwargs}
-    for k, v in mapper.items():
+def _getter(keys: Sequence):
+    keys = tuple(keys)
+    return lambda data: deep_get(data, keys)
+
+
+@cache
+def compile_mapping(model: type[models.Model]):
+    '''
+    ``MAPPING`` of a model as accessors, compiled once per model:
+    ``(field, getter)`` for plain fields and ``(field, lookup, getter)``
+    for related fields, resolved by ``lookup`` on the related model.
+    '''
+    fields, related = [], []
+    for k, v in MAPPING[model.__name__].items():
         field = model._meta.get_field(k)
-        if field.many_to_one or field.one_to_many or field.many_to_many or field.one_to_one:
+        if field.is_relation:
             assert isinstance(v, dict), f"{v} Related fields must be a dictionary"
-            param_key, param = tuple(v.items())[0]
-            param = deep_get(data, param.copy())
-            mapped[k] = field.related_model.objects\
-                .filter(**{param_key: param}).first()
+            lookup, keys = tuple(v.items())[0]
+            related.append((field, lookup, _getter(keys)))
         else:
-            mapped[k] = deep_get(data, v.copy())
-    obj = model(**mapped)
-    return obj
+            fields.append((field, _getter(v)))
+    return fields, related
+
+
+def _resolve(field, lookup: str, values: set):
+    '''pks of the related rows matching ``values`` by ``lookup``, one query'''
+    values = {value for value in values if value is not None}
+    if not values:
+        return {}
+    rows = field.related_model.objects.filter(**{f'{lookup}__in': values})\
+        .order_by('pk').values_list(lookup, 'pk')
+    resolved = {}
+    for value, pk in rows:
+        resolved.setdefault(value, pk)
+    return resolved
+
+
+def map_all(model: type[models.Model], records: Iterable[dict], **kwargs):
+    '''
+    Maps every record to an unsaved ``model`` instance. Related fields are
+    resolved with one query per related model and assigned as ``*_id``,
+    ``kwargs`` are set on every instance and take precedence over ``MAPPING``.
+    '''
+    fields, related = compile_mapping(model)
+    related = [(field, lookup, get) for field, lookup, get in related if field.name not in kwargs]
+    records = list(records)
+    mapped = [{field.name: get(data) for field, get in fields} for data in records]
+    for field, lookup, get in related:
+        values = [get(data) for data in records]
+        resolved = _resolve(field, lookup, set(values))
+        for row, value in zip(mapped, values):
+            row[field.attname] = resolved.get(value)
+    return [model(**{**row, **kwargs}) for row in mapped]
+
+
+def mapper(model: models.Model, data: dict, **kwargs):
+    return map_all(model, [data], **kwargs)[0]
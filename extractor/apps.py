@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ExtractorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'extractor'
+
+    def ready(self):
+        from extractor import checks  # noqa: F401
@@ -0,0 +1,178 @@
+'''
+Set-based rolling averages for fixtures
+'''
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from extractor.models import Fixture, Stats, AVERAGES_OVER_LAST_N_MATCHES
+
+logger = logging.getLogger(__name__)
+
+AVERAGE_FIELDS = [
+    'home_favor_goals_avg', 'home_against_goals_avg',
+    'away_favor_goals_avg', 'away_against_goals_avg',
+    'home_league_goals_avg', 'away_league_goals_avg',
+    'home_n', 'away_n', 'league_n',
+    ]
+
+STATS_COLUMNS = [
+    'shots_on_goal', 'shots_off_goal', 'total_shots', 'blocked_shots',
+    'shots_inside_box', 'shots_outside_box', 'fouls', 'corners', 'offsides',
+    'ball_possession', 'yellow_cards', 'red_cards', 'goalkeeper_saves',
+    'total_passes', 'passes_accurate',
+    ]
+STATS_FEATURES = [f'{side}_{kind}_{column}_avg' for column in STATS_COLUMNS
+                  for side in ('home', 'away') for kind in ('favor', 'against')]
+
+# team ids are nullable, the per-fixture properties group null teams together
+NULL_TEAM = -1
+
+
+def _window(source: pd.DataFrame, by: list, values: list, n: int | None = None):
+    '''
+    mean of ``values`` and number of rows over the last ``n`` rows of each
+    ``by`` group (or every previous row when ``n`` is None), at every source row.
+    '''
+    window = source[['date', *by]].copy()
+    counter = source.groupby(by, sort=False).cumcount() + 1 if by \
+        else pd.Series(range(1, len(source) + 1), index=source.index)
+    count = counter.clip(upper=n) if n else counter
+    for value in values:
+        total = source.groupby(by, sort=False)[value].cumsum() if by else source[value].cumsum()
+        if n:
+            lagged = total.groupby([source[col] for col in by], sort=False).shift(n, fill_value=0) \
+                if by else total.shift(n, fill_value=0)
+            total = total - lagged
+        window[value] = total / count
+    window['n'] = count
+    return window
+
+
+def _asof(targets: pd.DataFrame, window: pd.DataFrame, by: list):
+    '''last window row of the same ``by`` group with ``date <=`` each target date'''
+    if window.empty:
+        return pd.DataFrame(index=targets.index, columns=window.columns.drop(['date', *by]), dtype=float)
+    merged = pd.merge_asof(
+        targets[['date', *by]].reset_index(), window,
+        on='date', by=by or None, direction='backward', allow_exact_matches=True)
+    return merged.set_index('index').drop(columns=['date', *by])
+
+
+def league_fixtures(league: int) -> pd.DataFrame:
+    columns = ['id', 'date', 'season', 'season__current', 'home_team', 'away_team',
+               'home_goals', 'away_goals', *AVERAGE_FIELDS]
+    records = Fixture.objects.filter(season__league=league).values(*columns)
+    df = pd.DataFrame.from_records(records, columns=columns)
+    df = df.rename(columns={'season__current': 'current'})
+    df[['home_team', 'away_team']] = df[['home_team', 'away_team']].fillna(NULL_TEAM).astype(int)
+    df[['home_goals', 'away_goals', *AVERAGE_FIELDS]] = \
+        df[['home_goals', 'away_goals', *AVERAGE_FIELDS]].astype(float)
+    df['date'] = pd.to_datetime(df['date'], utc=True)
+    return df.sort_values(['date', 'id'], kind='mergesort').reset_index(drop=True)
+
+
+def compute_averages(fixtures: pd.DataFrame, targets: pd.DataFrame | None = None,
+                     n: int = AVERAGES_OVER_LAST_N_MATCHES) -> pd.DataFrame:
+    '''
+    Same numbers as the ``Fixture.f_*`` properties, for every target fixture
+    at once. ``fixtures`` holds the whole league history as returned by
+    ``league_fixtures``, ``targets`` defaults to all of them.
+    '''
+    targets = fixtures if targets is None else targets
+    finished = fixtures[fixtures.home_goals.notna() & fixtures.away_goals.notna()]
+    current = finished[finished.current.astype(bool)]
+
+    home_season = _asof(targets, _window(current, ['home_team', 'season'], ['home_goals'], n),
+                        ['home_team', 'season'])
+    home = _asof(targets, _window(current, ['home_team'], ['away_goals'], n), ['home_team'])
+    away = _asof(targets, _window(finished, ['away_team'], ['home_goals', 'away_goals'], n),
+                 ['away_team'])
+    league = _asof(targets, _window(finished, [], ['home_goals', 'away_goals']), [])
+    away_season = _asof(targets, _window(current, ['away_team', 'season'], [], n),
+                        ['away_team', 'season'])
+    season = _asof(targets, _window(current, ['season'], []), ['season'])
+
+    result = pd.DataFrame({
+        'id': targets.id,
+        'home_favor_goals_avg': home_season.home_goals,
+        'home_against_goals_avg': home.away_goals,
+        'away_favor_goals_avg': away.away_goals,
+        'away_against_goals_avg': away.home_goals,
+        'home_league_goals_avg': league.home_goals,
+        'away_league_goals_avg': league.away_goals,
+        'home_n': home_season.n.fillna(0),
+        'away_n': away_season.n.fillna(0),
+        'league_n': season.n.fillna(0),
+        }, index=targets.index)
+    return result.astype({field: float for field in AVERAGE_FIELDS})
+
+
+def calculate_league_avg(league: int, season: str | None = None, since: datetime | None = None,
+                         batch_size: int = 500):
+    '''
+    Recompute the goal averages of the fixtures of a league, optionally only
+    one of its seasons or the fixtures played from ``since`` on, and write
+    back the ones that changed with a single ``bulk_update``.
+    '''
+    fixtures = league_fixtures(league)
+    targets = fixtures
+    if season is not None:
+        targets = targets[targets.season == season]
+    if since is not None:
+        targets = targets[targets.date >= pd.to_datetime(since, utc=True)]
+    averages = compute_averages(fixtures, targets)
+    changed = ~np.isclose(averages[AVERAGE_FIELDS], targets[AVERAGE_FIELDS], equal_nan=True).all(axis=1)
+    models = [
+        Fixture(**{k: None if pd.isna(v) else v for k, v in row.items()})
+        for row in averages[changed].to_dict('records')]
+    updated = Fixture.objects.bulk_update(models, AVERAGE_FIELDS, batch_size=batch_size)
+    logger.info(f'league {league}: averages updated for {updated} of {len(targets)} fixtures')
+    return updated
+
+
+def league_stats(league: int) -> pd.DataFrame:
+    '''stats of the current season fixtures of a league, one row per fixture'''
+    columns = [f'{side}_{column}' for column in STATS_COLUMNS for side in ('home', 'away')]
+    records = Stats.objects.filter(fixture__season__league=league, fixture__season__current=True)\
+        .values('fixture__date', 'fixture__season', 'fixture__home_team', *columns)
+    df = pd.DataFrame.from_records(records, columns=['fixture__date', 'fixture__season',
+                                                     'fixture__home_team', *columns])
+    df = df.rename(columns={'fixture__date': 'date', 'fixture__season': 'season',
+                            'fixture__home_team': 'home_team'})
+    df['home_team'] = df['home_team'].fillna(NULL_TEAM).astype(int)
+    df[columns] = df[columns].astype(float)
+    df['date'] = pd.to_datetime(df['date'], utc=True)
+    return df.sort_values('date', kind='mergesort').reset_index(drop=True)
+
+
+def compute_stats_features(fixtures: pd.DataFrame, stats: pd.DataFrame,
+                           n: int = AVERAGES_OVER_LAST_N_MATCHES) -> pd.DataFrame:
+    '''
+    Same numbers as the ``Stats.f_*`` properties for every fixture at once:
+    means over the last ``n`` home matches of each team in the season with
+    both values of the column, ``favor`` from the home side, ``against``
+    from the visitor.
+    '''
+    home_targets = fixtures[['date', 'home_team', 'season']]
+    away_targets = fixtures[['date', 'away_team', 'season']].rename(columns={'away_team': 'home_team'})
+    features = {'id': fixtures.id}
+    for column in STATS_COLUMNS:
+        values = [f'home_{column}', f'away_{column}']
+        played = stats.dropna(subset=values)
+        window = _window(played, ['home_team', 'season'], values, n)
+        for side, targets in (('home', home_targets), ('away', away_targets)):
+            averages = _asof(targets, window, ['home_team', 'season'])
+            features[f'{side}_favor_{column}_avg'] = averages[f'home_{column}']
+            features[f'{side}_against_{column}_avg'] = averages[f'away_{column}']
+    result = pd.DataFrame(features, index=fixtures.index)
+    return result[['id', *STATS_FEATURES]].astype({feature: float for feature in STATS_FEATURES})
+
+
+def stats_features(league: int, season: str | None = None,
+                   n: int = AVERAGES_OVER_LAST_N_MATCHES) -> pd.DataFrame:
+    '''rolling stats averages of the fixtures of a league in two queries'''
+    fixtures = league_fixtures(league)
+    if season is not None:
+        fixtures = fixtures[fixtures.season == season]
+    return compute_stats_features(fixtures, league_stats(league), n)
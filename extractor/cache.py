@@ -0,0 +1,68 @@
+'''
+Versioned cache of read-only query results
+'''
+import logging
+import os
+from functools import wraps
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_TIMEOUT = int(os.environ.get('QUERY_CACHE_TIMEOUT', 15 * 60))
+DATA_VERSION_KEY = 'extractor:data-version'
+
+
+def data_version() -> int:
+    '''version of the synced data, part of every cached key'''
+    cache.add(DATA_VERSION_KEY, 1, timeout=None)
+    return cache.get(DATA_VERSION_KEY, 1)
+
+
+def bump_data_version() -> int:
+    '''invalidates every cached result, called when a sync task stores new data'''
+    try:
+        version = cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        version = 2
+        cache.set(DATA_VERSION_KEY, version, timeout=None)
+    logger.info(f'data version bumped to {version}')
+    return version
+
+
+def cache_key(*parts) -> str:
+    return ':'.join(['extractor', f'v{data_version()}', *map(str, parts)])
+
+
+def cached(key: str, compute, timeout: int = QUERY_CACHE_TIMEOUT):
+    '''``compute()`` served from the cache under ``key`` for the current data version'''
+    key = cache_key(key)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cache_view(timeout: int = QUERY_CACHE_TIMEOUT):
+    '''
+    Caches the successful GET responses of a view by path and query params
+    for the current data version.
+    '''
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            key = cache_key('view', f'{request.path}?{urlencode(sorted(request.GET.items()))}')
+            stored = cache.get(key)
+            if stored is not None:
+                content, content_type = stored
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), timeout)
+            return response
+        return wrapper
+    return decorator
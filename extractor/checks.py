@@ -0,0 +1,22 @@
+'''
+System checks of the extractor settings
+'''
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',
+                  'django.core.cache.backends.dummy.DummyCache')
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    '''
+    The data version, the query results and the API quota live in the
+    default cache, a per-process one leaves every worker its own copy.
+    A warning, the local memory fallback still serves single process runs.
+    '''
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in PROCESS_CACHES:
+        return []
+    return [Warning('the default cache is not shared between processes',
+                    hint='set CACHE_URL to a Redis or file based cache',
+                    id='extractor.W001')]
@@ -0,0 +1,85 @@
+# Generated by Django 6.0.9 on 2026-10-18 10:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extractor', '0034_userbets_userbetitems'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Prediction',
+            fields=[
+                ('fixture', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='extractor.fixture')),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('l_attack', models.FloatField(null=True)),
+                ('l_defense', models.FloatField(null=True)),
+                ('v_attack', models.FloatField(null=True)),
+                ('v_defense', models.FloatField(null=True)),
+                ('l_expected', models.FloatField(null=True)),
+                ('v_expected', models.FloatField(null=True)),
+                ('l0', models.FloatField(null=True)),
+                ('l1', models.FloatField(null=True)),
+                ('l2', models.FloatField(null=True)),
+                ('l3', models.FloatField(null=True)),
+                ('l4', models.FloatField(null=True)),
+                ('l5', models.FloatField(null=True)),
+                ('l6', models.FloatField(null=True)),
+                ('l7', models.FloatField(null=True)),
+                ('l8', models.FloatField(null=True)),
+                ('l_over', models.FloatField(null=True)),
+                ('v0', models.FloatField(null=True)),
+                ('v1', models.FloatField(null=True)),
+                ('v2', models.FloatField(null=True)),
+                ('v3', models.FloatField(null=True)),
+                ('v4', models.FloatField(null=True)),
+                ('v5', models.FloatField(null=True)),
+                ('v6', models.FloatField(null=True)),
+                ('v7', models.FloatField(null=True)),
+                ('v8', models.FloatField(null=True)),
+                ('v_over', models.FloatField(null=True)),
+                ('al0', models.FloatField(null=True)),
+                ('al1', models.FloatField(null=True)),
+                ('al2', models.FloatField(null=True)),
+                ('al3', models.FloatField(null=True)),
+                ('al4', models.FloatField(null=True)),
+                ('al5', models.FloatField(null=True)),
+                ('al6', models.FloatField(null=True)),
+                ('al7', models.FloatField(null=True)),
+                ('al8', models.FloatField(null=True)),
+                ('av0', models.FloatField(null=True)),
+                ('av1', models.FloatField(null=True)),
+                ('av2', models.FloatField(null=True)),
+                ('av3', models.FloatField(null=True)),
+                ('av4', models.FloatField(null=True)),
+                ('av5', models.FloatField(null=True)),
+                ('av6', models.FloatField(null=True)),
+                ('av7', models.FloatField(null=True)),
+                ('av8', models.FloatField(null=True)),
+                ('win', models.FloatField(null=True)),
+                ('lose', models.FloatField(null=True)),
+                ('draw', models.FloatField(null=True)),
+                ('l_15', models.FloatField(null=True)),
+                ('l_25', models.FloatField(null=True)),
+                ('l_35', models.FloatField(null=True)),
+                ('l_45', models.FloatField(null=True)),
+                ('l_55', models.FloatField(null=True)),
+                ('l_65', models.FloatField(null=True)),
+                ('l_75', models.FloatField(null=True)),
+                ('l_85', models.FloatField(null=True)),
+                ('v_15', models.FloatField(null=True)),
+                ('v_25', models.FloatField(null=True)),
+                ('v_35', models.FloatField(null=True)),
+                ('v_45', models.FloatField(null=True)),
+                ('v_55', models.FloatField(null=True)),
+                ('v_65', models.FloatField(null=True)),
+                ('v_75', models.FloatField(null=True)),
+                ('v_85', models.FloatField(null=True)),
+                ('o_05', models.FloatField(null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.9 on 2026-10-18 11:03
+
+from itertools import batched
+from django.db import migrations, models, transaction
+from django.db.models import Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_status_short(apps, schema_editor):
+    Fixture = apps.get_model('extractor', 'Fixture')
+    pks = Fixture.objects.order_by('pk').values_list('pk', flat=True)
+    for batch in batched(pks.iterator(chunk_size=BATCH_SIZE), BATCH_SIZE):
+        with transaction.atomic():
+            Fixture.objects.filter(pk__in=batch)\
+                .update(status_short=Coalesce(KT('status__short'), Value('')))
+
+
+class Migration(migrations.Migration):
+    # every backfill batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('extractor', '0035_prediction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fixture',
+            name='status_short',
+            field=models.CharField(blank=True, default='', max_length=8),
+        ),
+        migrations.RunPython(backfill_status_short, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['date', 'status_short'], name='extractor_f_date_a79065_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['home_team', 'date'], name='extractor_f_home_te_faeb55_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['away_team', 'date'], name='extractor_f_away_te_f92bd0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['season', 'date'], name='extractor_f_season__240b22_idx'),
+        ),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 6.0.9 on 2026-10-18 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 5000
+
+
+def keyset(queryset, *fields):
+    '''``fields`` of ``queryset`` in batches of BATCH_SIZE rows by ascending primary key'''
+    queryset = queryset.order_by('pk').values_list('pk', *fields)
+    while batch := list(queryset[:BATCH_SIZE]):
+        yield batch
+        queryset = queryset.filter(pk__gt=batch[-1][0])
+
+
+def copy_odds(apps, schema_editor):
+    Odds, NewOdds = apps.get_model('extractor', 'Odds'), apps.get_model('extractor', 'NewOdds')
+    OddValues, NewOddValues = apps.get_model('extractor', 'OddValues'), apps.get_model('extractor', 'NewOddValues')
+    UserBetItems = apps.get_model('extractor', 'UserBetItems')
+
+    for batch in keyset(Odds.objects, 'bookmaker', 'bet', 'fixture'):
+        with transaction.atomic():
+            NewOdds.objects.bulk_create(
+                NewOdds(legacy_id=pk, bookmaker_id=bookmaker, bet_id=bet, fixture_id=fixture)
+                for pk, bookmaker, bet, fixture in batch)
+
+    for batch in keyset(OddValues.objects, 'odd', 'key', 'prob_name', 'value'):
+        odds = dict(NewOdds.objects.filter(legacy_id__in={row[1] for row in batch}).values_list('legacy_id', 'pk'))
+        with transaction.atomic():
+            NewOddValues.objects.bulk_create(
+                NewOddValues(legacy_id=pk, odd_id=odds[odd], key=key, prob_name=prob_name, value=value)
+                for pk, odd, key, prob_name, value in batch)
+
+    for batch in keyset(UserBetItems.objects, 'odd_value'):
+        values = dict(NewOddValues.objects.filter(legacy_id__in={row[1] for row in batch})
+                      .values_list('legacy_id', 'pk'))
+        with transaction.atomic():
+            UserBetItems.objects.bulk_update(
+                [UserBetItems(pk=pk, new_odd_value_id=values[odd_value]) for pk, odd_value in batch],
+                ['new_odd_value'])
+
+
+class Migration(migrations.Migration):
+    # the string keys cannot be cast in place, the rows are copied to new
+    # tables in batches that commit on their own and the tables swapped
+    atomic = False
+
+    dependencies = [
+        ('extractor', '0036_fixture_status_short'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewOdds',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('legacy_id', models.CharField(db_index=True, max_length=128, null=True)),
+                ('bet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='extractor.bet')),
+                ('bookmaker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='extractor.bookmaker')),
+                ('fixture', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='extractor.fixture')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NewOddValues',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('legacy_id', models.CharField(db_index=True, max_length=128, null=True)),
+                ('key', models.CharField(max_length=32)),
+                ('prob_name', models.CharField(blank=True, max_length=32)),
+                ('value', models.FloatField()),
+                ('odd', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='extractor.newodds')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='userbetitems',
+            name='new_odd_value',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='extractor.newoddvalues'),
+        ),
+        migrations.RunPython(copy_odds),
+        migrations.RemoveField(
+            model_name='userbetitems',
+            name='odd_value',
+        ),
+        migrations.DeleteModel(
+            name='OddValues',
+        ),
+        migrations.DeleteModel(
+            name='Odds',
+        ),
+        migrations.RenameModel(
+            old_name='NewOdds',
+            new_name='Odds',
+        ),
+        migrations.RenameModel(
+            old_name='NewOddValues',
+            new_name='OddValues',
+        ),
+        migrations.RenameField(
+            model_name='userbetitems',
+            old_name='new_odd_value',
+            new_name='odd_value',
+        ),
+        migrations.AlterField(
+            model_name='userbetitems',
+            name='odd_value',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='extractor.oddvalues'),
+        ),
+        migrations.RemoveField(
+            model_name='odds',
+            name='legacy_id',
+        ),
+        migrations.RemoveField(
+            model_name='oddvalues',
+            name='legacy_id',
+        ),
+        migrations.AddConstraint(
+            model_name='odds',
+            constraint=models.UniqueConstraint(fields=('fixture', 'bookmaker', 'bet'), name='unique_odds'),
+        ),
+        migrations.AddConstraint(
+            model_name='oddvalues',
+            constraint=models.UniqueConstraint(fields=('odd', 'key'), name='unique_odd_values'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.9 on 2026-10-18 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+BATCH_SIZE = 5000
+
+
+def seed_history(apps, schema_editor):
+    '''
+    One history row per stored value. Its capture time is unknown, values
+    of fixtures already started are taken as their kick off price.
+    '''
+    OddValues, OddHistory = apps.get_model('extractor', 'OddValues'), apps.get_model('extractor', 'OddHistory')
+    now = timezone.now()
+    queryset = OddValues.objects.order_by('pk').values_list('pk', 'value', 'odd__fixture__date')
+    while batch := list(queryset[:BATCH_SIZE]):
+        with transaction.atomic():
+            OddHistory.objects.bulk_create(
+                OddHistory(odd_value_id=pk, value=value, captured_at=min(date or now, now))
+                for pk, value, date in batch)
+        queryset = queryset.filter(pk__gt=batch[-1][0])
+
+
+class Migration(migrations.Migration):
+    # the seed commits per batch
+    atomic = False
+
+    dependencies = [
+        ('extractor', '0037_odds_bigint_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OddHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('captured_at', models.DateTimeField()),
+                ('value', models.FloatField()),
+                ('odd_value', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='history', to='extractor.oddvalues')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('odd_value', 'captured_at'), name='unique_odd_history')],
+            },
+        ),
+        migrations.RunPython(seed_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0.9 on 2026-10-18 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('extractor', '0038_oddhistory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fixture',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='fixture',
+            index=models.Index(fields=['next_poll_at'], name='extractor_f_next_po_60c78e_idx'),
+        ),
+    ]
@@ -1,11 +1,13 @@
 import os
 from django.db import models
 from django.db.models import Avg, Count, Max, Sum
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from extractor.cache import bump_data_version
 
-AVERAGES_OVER_LAST_N_MATCHES = os.environ.get('AVERAGES_OVER_LAST_N_MATCHES', 10)
+# last matches averaged by the fixture and the Stats properties and by extractor.averages
+AVERAGES_OVER_LAST_N_MATCHES = int(os.environ.get('AVERAGES_OVER_LAST_N_MATCHES', 10))
 
 class UserConfig(models.Model):
     use_stats = models.BooleanField(default=False)
@@ -127,6 +129,8 @@ class Fixture(models.Model):
     venue = models.ForeignKey(Venue, on_delete=models.SET_NULL, null=True)
     periods = models.JSONField()
     status = models.JSONField()
+    # status['short'] as a plain column, the model queries filter on it
+    status_short = models.CharField(max_length=8, blank=True, default='')
     season = models.ForeignKey(Season, on_delete=models.SET_NULL, null=True)
     home_team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, related_name='home')
     away_team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, related_name='away')
@@ -143,12 +147,31 @@ class Fixture(models.Model):
     home_n = models.FloatField(null=True)
     away_n = models.FloatField(null=True)
     league_n = models.FloatField(null=True)
+    # set by the poller from the distance to kick off, null is due now
+    next_poll_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'status_short']),
+            models.Index(fields=['next_poll_at']),
+            models.Index(fields=['home_team', 'date']),
+            models.Index(fields=['away_team', 'date']),
+            models.Index(fields=['season', 'date']),
+            ]
 
     def __str__(self):
         home_team_name = self.home_team.name if self.home_team else 'N/A'
         away_team_name = self.away_team.name if self.away_team else 'N/A'
         return f'{self.id} - {home_team_name} vs {away_team_name}'
 
+    def set_status_short(self):
+        '''bulk loads skip save(), the loaders call this before writing'''
+        self.status_short = (self.status or {}).get('short') or ''
+
+    def save(self, *args, **kwargs):
+        self.set_status_short()
+        super().save(*args, **kwargs)
+
     @property
     def f_home_favor_goals_avg(self):
         fixtures = Fixture.objects.filter(
@@ -250,13 +273,87 @@ class Fixture(models.Model):
         return fixtures.aggregate(Count('id'))['id__count']
 
 
+class Prediction(models.Model):
+    fixture = models.OneToOneField(Fixture, on_delete=models.CASCADE, primary_key=True)
+    updated = models.DateTimeField(auto_now=True)
+    l_attack = models.FloatField(null=True)
+    l_defense = models.FloatField(null=True)
+    v_attack = models.FloatField(null=True)
+    v_defense = models.FloatField(null=True)
+    l_expected = models.FloatField(null=True)
+    v_expected = models.FloatField(null=True)
+    l0 = models.FloatField(null=True)
+    l1 = models.FloatField(null=True)
+    l2 = models.FloatField(null=True)
+    l3 = models.FloatField(null=True)
+    l4 = models.FloatField(null=True)
+    l5 = models.FloatField(null=True)
+    l6 = models.FloatField(null=True)
+    l7 = models.FloatField(null=True)
+    l8 = models.FloatField(null=True)
+    l_over = models.FloatField(null=True)
+    v0 = models.FloatField(null=True)
+    v1 = models.FloatField(null=True)
+    v2 = models.FloatField(null=True)
+    v3 = models.FloatField(null=True)
+    v4 = models.FloatField(null=True)
+    v5 = models.FloatField(null=True)
+    v6 = models.FloatField(null=True)
+    v7 = models.FloatField(null=True)
+    v8 = models.FloatField(null=True)
+    v_over = models.FloatField(null=True)
+    al0 = models.FloatField(null=True)
+    al1 = models.FloatField(null=True)
+    al2 = models.FloatField(null=True)
+    al3 = models.FloatField(null=True)
+    al4 = models.FloatField(null=True)
+    al5 = models.FloatField(null=True)
+    al6 = models.FloatField(null=True)
+    al7 = models.FloatField(null=True)
+    al8 = models.FloatField(null=True)
+    av0 = models.FloatField(null=True)
+    av1 = models.FloatField(null=True)
+    av2 = models.FloatField(null=True)
+    av3 = models.FloatField(null=True)
+    av4 = models.FloatField(null=True)
+    av5 = models.FloatField(null=True)
+    av6 = models.FloatField(null=True)
+    av7 = models.FloatField(null=True)
+    av8 = models.FloatField(null=True)
+    win = models.FloatField(null=True)
+    lose = models.FloatField(null=True)
+    draw = models.FloatField(null=True)
+    l_15 = models.FloatField(null=True)
+    l_25 = models.FloatField(null=True)
+    l_35 = models.FloatField(null=True)
+    l_45 = models.FloatField(null=True)
+    l_55 = models.FloatField(null=True)
+    l_65 = models.FloatField(null=True)
+    l_75 = models.FloatField(null=True)
+    l_85 = models.FloatField(null=True)
+    v_15 = models.FloatField(null=True)
+    v_25 = models.FloatField(null=True)
+    v_35 = models.FloatField(null=True)
+    v_45 = models.FloatField(null=True)
+    v_55 = models.FloatField(null=True)
+    v_65 = models.FloatField(null=True)
+    v_75 = models.FloatField(null=True)
+    v_85 = models.FloatField(null=True)
+    o_05 = models.FloatField(null=True)
+
+    def __str__(self):
+        return f'Prediction for Fixture {self.fixture}'
+
 
 class Odds(models.Model):
-    id = models.CharField(max_length=128, primary_key=True)
     bookmaker = models.ForeignKey(BookMaker, on_delete=models.CASCADE)
     bet = models.ForeignKey(Bet, on_delete=models.CASCADE)
     fixture = models.ForeignKey(Fixture, on_delete=models.CASCADE, null=True)
 
+    class Meta:
+        # fixture first, its index also serves the joins from the fixtures
+        constraints = [models.UniqueConstraint(fields=['fixture', 'bookmaker', 'bet'], name='unique_odds')]
+
     def __str__(self):
         home_team_name = self.fixture.home_team.name if self.fixture.home_team else 'N/A'
         away_team_name = self.fixture.away_team.name if self.fixture.away_team else 'N/A'
@@ -264,16 +361,31 @@ class Odds(models.Model):
 
 
 class OddValues(models.Model):
-    id = models.CharField(max_length=128, primary_key=True)
     odd = models.ForeignKey(Odds, on_delete=models.CASCADE)
     key = models.CharField(max_length=32)
     prob_name = models.CharField(max_length=32, blank=True)
     value = models.FloatField()
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['odd', 'key'], name='unique_odd_values')]
+
     def __str__(self):
         return f'<Odd: id={self.odd.pk}> {self.odd.bet.name}: {self.key}'
 
 
+class OddHistory(models.Model):
+    '''append-only prices of an odd value, one row per change'''
+    odd_value = models.ForeignKey(OddValues, on_delete=models.CASCADE, related_name='history',
+                                  db_index=False)
+    captured_at = models.DateTimeField()
+    value = models.FloatField()
+
+    class Meta:
+        # serves the price of a value at any moment, latest first
+        constraints = [models.UniqueConstraint(fields=['odd_value', 'captured_at'],
+                                               name='unique_odd_history')]
+
+
 class UserBets(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     creation_date = models.DateTimeField(auto_now=True)
@@ -350,7 +462,7 @@ class Stats(models.Model):
             away_shots_on_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_on_goal'))['home_shots_on_goal__avg']
 
     @property
@@ -362,7 +474,7 @@ class Stats(models.Model):
             away_shots_on_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_on_goal'))['away_shots_on_goal__avg']
 
     @property
@@ -374,7 +486,7 @@ class Stats(models.Model):
             away_shots_on_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_on_goal'))['home_shots_on_goal__avg']
 
     @property
@@ -386,7 +498,7 @@ class Stats(models.Model):
             away_shots_on_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_on_goal'))['away_shots_on_goal__avg']
 
     # Shots off Goal Averages
@@ -399,7 +511,7 @@ class Stats(models.Model):
             away_shots_off_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_off_goal'))['home_shots_off_goal__avg']
 
     @property
@@ -411,7 +523,7 @@ class Stats(models.Model):
             away_shots_off_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_off_goal'))['away_shots_off_goal__avg']
 
     @property
@@ -423,7 +535,7 @@ class Stats(models.Model):
             away_shots_off_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_off_goal'))['home_shots_off_goal__avg']
 
     @property
@@ -435,7 +547,7 @@ class Stats(models.Model):
             away_shots_off_goal__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_off_goal'))['away_shots_off_goal__avg']
 
     # Total shots Averages
@@ -448,7 +560,7 @@ class Stats(models.Model):
             away_total_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_total_shots'))['home_total_shots__avg']
 
     @property
@@ -460,8 +572,8 @@ class Stats(models.Model):
             away_total_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
-        return fixtures.aggregate(Avg('away_total_shots'))['away_shots_total_shots__avg']
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
+        return fixtures.aggregate(Avg('away_total_shots'))['away_total_shots__avg']
 
     @property
     def f_away_favor_total_shots_avg(self):
@@ -472,7 +584,7 @@ class Stats(models.Model):
             away_total_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_total_shots'))['home_total_shots__avg']
 
     @property
@@ -484,7 +596,7 @@ class Stats(models.Model):
             away_total_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_total_shots'))['away_total_shots__avg']
 
     # Blocked shots Averages
@@ -497,7 +609,7 @@ class Stats(models.Model):
             away_blocked_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_blocked_shots'))['home_blocked_shots__avg']
 
     @property
@@ -509,8 +621,8 @@ class Stats(models.Model):
             away_blocked_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
-        return fixtures.aggregate(Avg('away_blocked_shots'))['away_blocked_total_shots__avg']
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
+        return fixtures.aggregate(Avg('away_blocked_shots'))['away_blocked_shots__avg']
 
     @property
     def f_away_favor_blocked_shots_avg(self):
@@ -521,7 +633,7 @@ class Stats(models.Model):
             away_blocked_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_blocked_shots'))['home_blocked_shots__avg']
 
     @property
@@ -533,7 +645,7 @@ class Stats(models.Model):
             away_blocked_shots__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_blocked_shots'))['away_blocked_shots__avg']
 
     # Shots inside box Averages
@@ -546,7 +658,7 @@ class Stats(models.Model):
             away_shots_inside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_inside_box'))['home_shots_inside_box__avg']
 
     @property
@@ -558,7 +670,7 @@ class Stats(models.Model):
             away_shots_inside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_inside_box'))['away_shots_inside_box__avg']
 
     @property
@@ -570,7 +682,7 @@ class Stats(models.Model):
             away_shots_inside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_inside_box'))['home_shots_inside_box__avg']
 
     @property
@@ -582,7 +694,7 @@ class Stats(models.Model):
             away_shots_inside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_inside_box'))['away_shots_inside_box__avg']
 
     # Shots outside box Averages
@@ -595,7 +707,7 @@ class Stats(models.Model):
             away_shots_outside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_outside_box'))['home_shots_outside_box__avg']
 
     @property
@@ -607,7 +719,7 @@ class Stats(models.Model):
             away_shots_outside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_outside_box'))['away_shots_outside_box__avg']
 
     @property
@@ -619,7 +731,7 @@ class Stats(models.Model):
             away_shots_outside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_shots_outside_box'))['home_shots_outside_box__avg'] 
 
     @property
@@ -631,7 +743,7 @@ class Stats(models.Model):
             away_shots_outside_box__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_shots_outside_box'))['away_shots_outside_box__avg']
 
     # Fouls Averages
@@ -644,7 +756,7 @@ class Stats(models.Model):
             away_fouls__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_fouls'))['home_fouls__avg']
 
     @property
@@ -656,7 +768,7 @@ class Stats(models.Model):
             away_fouls__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_fouls'))['away_fouls__avg']
 
     @property
@@ -668,7 +780,7 @@ class Stats(models.Model):
             away_fouls__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('home_fouls'))['home_fouls__avg']
 
     @property
@@ -680,7 +792,17 @@ class Stats(models.Model):
             away_fouls__isnull=False,
             fixture__season=self.fixture.season,
             fixture__season__current=True)\
-            .order_by('-fixture__date')[:10]
+            .order_by('-fixture__date')[:AVERAGES_OVER_LAST_N_MATCHES]
         return fixtures.aggregate(Avg('away_fouls'))['away_fouls__avg']
 
-    
\ No newline at end of file
+    
+
+
+def invalidate_cached_queries(sender, **kwargs):
+    bump_data_version()
+
+
+# bulk loads of the sync tasks bump the version themselves, this covers admin edits
+for model in (Country, League, BookMaker, Bet, BetParameter):
+    post_save.connect(invalidate_cached_queries, sender=model, dispatch_uid=f'invalidate_{model.__name__}')
+    post_delete.connect(invalidate_cached_queries, sender=model, dispatch_uid=f'invalidate_{model.__name__}')
@@ -0,0 +1,47 @@
+'''
+Price history of the odd values
+'''
+import logging
+from datetime import datetime
+from typing import Iterable
+from django.db.models import OuterRef, QuerySet, Subquery
+from django.utils import timezone
+from extractor.models import OddHistory, OddValues
+
+logger = logging.getLogger(__name__)
+
+
+def record_prices(values: Iterable[OddValues], captured_at: datetime | None = None,
+                  batch_size: int = 1000):
+    '''
+    Appends the current price of ``values``, the stored rows whose price
+    changed in a load. Storage grows with price changes, not with polls.
+    '''
+    captured_at = captured_at or timezone.now()
+    rows = [OddHistory(odd_value_id=value.pk, captured_at=captured_at, value=value.value)
+            for value in values]
+    OddHistory.objects.bulk_create(rows, batch_size=batch_size, ignore_conflicts=True)
+    return len(rows)
+
+
+def price_at(moment) -> Subquery:
+    '''
+    last recorded price of the outer ``OddValues`` row at ``moment``, a
+    datetime or an expression, read from the ``(odd_value, captured_at)`` index
+    '''
+    return Subquery(OddHistory.objects
+                    .filter(odd_value=OuterRef('pk'), captured_at__lte=moment)
+                    .order_by('-captured_at').values('value')[:1])
+
+
+def with_prices(values: QuerySet | None = None, at: datetime | None = None) -> QuerySet:
+    '''
+    ``OddValues`` annotated with ``kickoff_value``, the price when their
+    fixture started, and ``value_at`` when a moment ``at`` is given. The
+    latest price is ``value`` itself.
+    '''
+    values = OddValues.objects.all() if values is None else values
+    values = values.annotate(kickoff_value=price_at(OuterRef('odd__fixture__date')))
+    if at is not None:
+        values = values.annotate(value_at=price_at(at))
+    return values
@@ -1,14 +1,23 @@
-from typing import Tuple
+import os
+from typing import Sequence, Tuple
 from .models import BetParameter, Fixture, OddValues
+from .cache import cached
+from .poisson_np import MAX_GOALS, PROB_COLUMNS, poisson_frame
 from django.db.models.functions import Exp, Power, Coalesce, NullIf, Sign, Floor
 from math import factorial
 from django.db.models import F, Q, Case, When
 from datetime import datetime, timedelta
+import pandas as pd
 import logging
 
 logger = logging.getLogger(__name__)
 
 INPLAY_STATUS = ('TBD', 'NS', '1H', '2H', 'HT', 'ET', 'BT', 'P', 'SUSP', 'INT', 'LIVE')
+EXPECTED_COLUMNS = ('l_attack', 'l_defense', 'v_attack', 'v_defense', 'l_expected', 'v_expected')
+# read the stored predictions, only once refresh_predictions has filled them
+PREDICTIONS_MATERIALIZED = os.environ.get('PREDICTIONS_MATERIALIZED', 'FALSE') == 'TRUE'
+POISSON_BACKENDS = ('sql', 'numpy', 'stored')
+POISSON_BACKEND = os.environ.get('POISSON_BACKEND', 'stored' if PREDICTIONS_MATERIALIZED else 'sql')
 
 def fixture_qry(date_filter: datetime | Tuple[datetime, datetime] | None = None,
                   league: int | None = None, overall: bool = False,
@@ -34,7 +43,7 @@ def fixture_qry(date_filter: datetime | Tuple[datetime, datetime] | None = None,
                                           date__lt=datetime.now() + timedelta(8)
                                           )
     if not list_all:
-        fixtures = fixtures.filter(status__short__in=INPLAY_STATUS)
+        fixtures = fixtures.filter(status_short__in=INPLAY_STATUS)
     if league:
         fixtures = fixtures.filter(season__league__id=league)
     else:
@@ -95,7 +104,7 @@ def bookmaker_fixture_qry(date_filter: datetime | Tuple[datetime, datetime] | No
         fixtures = fixtures.filter(odd__fixture__season__league__sync_on=True)
 
     if  not list_all:
-        fixtures = fixtures.filter(odd__fixture__status__short__in=INPLAY_STATUS)
+        fixtures = fixtures.filter(odd__fixture__status_short__in=INPLAY_STATUS)
     if overall:
         l_factor = (NullIf(F('odd__fixture__home_league_goals_avg'), 0.) +
                     NullIf(F('odd__fixture__away_league_goals_avg'), 0.)) / 2
@@ -140,107 +149,134 @@ def bookmaker_fixture_qry(date_filter: datetime | Tuple[datetime, datetime] | No
     return expected.filter(home_n__gte=3, away_n__gte=3, league_n__gte=5)
 
 
-def poisson_model(date_filter: datetime | Tuple[datetime, datetime] | None = None,
-                  league: int | None = None, overall: bool = False,
-                  bookmaker: int | None = None, list_all: bool = False, kelly: bool = False):
+def expected_qry(date_filter: datetime | Tuple[datetime, datetime] | None = None,
+                 league: int | None = None, overall: bool = False,
+                 bookmaker: int | None = None, list_all: bool = False, kelly: bool = False):
+    if bookmaker:
+        return bookmaker_fixture_qry(date_filter, league, overall, bookmaker, list_all=list_all)
+    elif not bookmaker and kelly:
+        return bookmaker_fixture_qry(date_filter, league, overall, list_all=list_all)
+    return fixture_qry(date_filter, league, overall, list_all=list_all)
+
+
+def _references(expression) -> set:
+    '''names of the annotations an expression reads through ``F``'''
+    if isinstance(expression, F):
+        return {expression.name}
+    return set().union(*map(_references, expression.get_source_expressions()))
+
 
+def poisson_annotations() -> list[dict]:
+    '''annotate stages of the SQL model, every stage only reads the previous ones'''
     def poisson_pdf(l_: str, k_: int):
         return Power(F(l_), k_) * Exp(-F(l_)) / factorial(k_)
 
-    if bookmaker:
-        expected = bookmaker_fixture_qry(date_filter, league, overall, bookmaker, list_all=list_all)
-    elif not bookmaker and kelly:
-        expected = bookmaker_fixture_qry(date_filter, league, overall, list_all=list_all)
-    else:
-        expected = fixture_qry(date_filter, league, overall, list_all=list_all)
-
-    expected = expected.annotate(
-        l0=poisson_pdf('l_expected', 0), v0=poisson_pdf('v_expected', 0),
-        l1=poisson_pdf('l_expected', 1), v1=poisson_pdf('v_expected', 1),
-        l2=poisson_pdf('l_expected', 2), v2=poisson_pdf('v_expected', 2),
-        l3=poisson_pdf('l_expected', 3), v3=poisson_pdf('v_expected', 3),
-        l4=poisson_pdf('l_expected', 4), v4=poisson_pdf('v_expected', 4),
-        l5=poisson_pdf('l_expected', 5), v5=poisson_pdf('v_expected', 5),
-        l6=poisson_pdf('l_expected', 6), v6=poisson_pdf('v_expected', 6),
-        l7=poisson_pdf('l_expected', 7), v7=poisson_pdf('v_expected', 7),
-        l8=poisson_pdf('l_expected', 8), v8=poisson_pdf('v_expected', 8),
-        )
-    expected = expected.annotate(
-        l_over=1 - (F('l0') + F('l1') + F('l2') + F('l3') +
-                    F('l4') + F('l5') + F('l6') + F('l7') + F('l8')),
-        v_over=1 - (F('v0') + F('v1') + F('v2') + F('v3') +
-                    F('v4') + F('v5') + F('v6') + F('v7') + F('v8')))
-    expected = expected.annotate(
-        al0=F('l0'),
-        al1=F('l0') + F('l1'),
-        al2=F('l0') + F('l1') + F('l2'),
-        al3=F('l0') + F('l1') + F('l2') + F('l3'),
-        al4=F('l0') + F('l1') + F('l2') + F('l3') + F('l4'),
-        al5=F('l0') + F('l1') + F('l2') + F('l3') + F('l4') + F('l5'),
-        al6=F('l0') + F('l1') + F('l2') + F('l3') + F('l4') + F('l5') + F('l6'),
-        al7=F('l0') + F('l1') + F('l2') + F('l3') + F('l4') + F('l5') + F('l6') + F('l7'),
-        al8=F('l0') + F('l1') + F('l2') + F('l3') + F('l4') + F('l5') + F('l6') + F('l7') + F('l8'),
-        av0=F('v0'),
-        av1=F('v0') + F('v1'),
-        av2=F('v0') + F('v1') + F('v2'),
-        av3=F('v0') + F('v1') + F('v2') + F('v3'),
-        av4=F('v0') + F('v1') + F('v2') + F('v3') + F('v4'),
-        av5=F('v0') + F('v1') + F('v2') + F('v3') + F('v4') + F('v5'),
-        av6=F('v0') + F('v1') + F('v2') + F('v3') + F('v4') + F('v5') + F('v6'),
-        av7=F('v0') + F('v1') + F('v2') + F('v3') + F('v4') + F('v5') + F('v6') + F('v7'),
-        av8=F('v0') + F('v1') + F('v2') + F('v3') + F('v4') + F('v5') + F('v6') + F('v7') + F('v8'),
-        )
-    expected = expected.annotate(
-        win=F('l_over') * F('av8')
-        + F('l8') * F('av7')
-        + F('l7') * F('av6')
-        + F('l6') * F('av5')
-        + F('l5') * F('av4')
-        + F('l4') * F('av3')
-        + F('l3') * F('av2')
-        + F('l2') * F('av1')
-        + F('l1') * F('av0'),
-        lose=F('v_over') * F('al8')
-        + F('v8') * F('al7')
-        + F('v7') * F('al6')
-        + F('v6') * F('al5')
-        + F('v5') * F('al4')
-        + F('v4') * F('al3')
-        + F('v3') * F('al2')
-        + F('v2') * F('al1')
-        + F('v1') * F('al0'),
-        draw=F('l_over') * F('v_over')
-        + F('l8') * F('v8')
-        + F('l7') * F('v7')
-        + F('l6') * F('v6')
-        + F('l5') * F('v5')
-        + F('l4') * F('v4')
-        + F('l3') * F('v3')
-        + F('l2') * F('v2')
-        + F('l1') * F('v1')
-        + F('l0') * F('v0'),
-        l_15=1 - F('al1'), v_15=1 - F('av1'),
-        l_25=1 - F('al2'), v_25=1 - F('av2'),
-        l_35=1 - F('al3'), v_35=1 - F('av3'),
-        l_45=1 - F('al4'), v_45=1 - F('av4'),
-        l_55=1 - F('al5'), v_55=1 - F('av5'),
-        l_65=1 - F('al6'), v_65=1 - F('av6'),
-        l_75=1 - F('al7'), v_75=1 - F('av7'),
-        l_85=1 - F('al8'), v_85=1 - F('av8'),
-        o_05=1 - F('l0') * F('v0')
-        )
-    return expected.filter(Q(win__isnull=False) | Q(lose__isnull=False))
+    def total(*columns):
+        return sum((F(column) for column in columns[1:]), F(columns[0]))
+
+    goals = range(MAX_GOALS + 1)
+    pmf = {}
+    for k in goals:
+        pmf[f'l{k}'], pmf[f'v{k}'] = poisson_pdf('l_expected', k), poisson_pdf('v_expected', k)
+    over = {'l_over': 1 - total(*[f'l{k}' for k in goals]),
+            'v_over': 1 - total(*[f'v{k}' for k in goals])}
+    cumulative = {f'{side}{k}': total(*[f'{side[1]}{i}' for i in range(k + 1)])
+                  for side in ('al', 'av') for k in goals}
+    markets = {
+        'win': F('l_over') * F(f'av{MAX_GOALS}') + total_products('l', 'av'),
+        'lose': F('v_over') * F(f'al{MAX_GOALS}') + total_products('v', 'al'),
+        'draw': F('l_over') * F('v_over') + sum((F(f'l{k}') * F(f'v{k}') for k in goals[1:]),
+                                               F('l0') * F('v0')),
+        **{f'{side}_{k}5': 1 - F(f'a{side}{k}') for k in goals[1:] for side in 'lv'},
+        'o_05': 1 - F('l0') * F('v0'),
+        }
+    return [pmf, over, cumulative, markets]
+
+
+def total_products(side: str, other: str):
+    '''sum of P(side scores k) * P(other scores at most k - 1) for k in 1..MAX_GOALS'''
+    return sum((F(f'{side}{k}') * F(f'{other}{k - 1}') for k in range(2, MAX_GOALS + 1)),
+               F(f'{side}1') * F(f'{other}0'))
+
+
+def poisson_model(date_filter: datetime | Tuple[datetime, datetime] | None = None,
+                  league: int | None = None, overall: bool = False,
+                  bookmaker: int | None = None, list_all: bool = False, kelly: bool = False,
+                  materialized: bool = False, columns: Sequence[str] | None = None):
+    '''
+    Expected goals and Poisson probabilities of the fixtures (or odd values
+    with ``bookmaker`` / ``kelly``). ``columns`` limits the probability
+    columns to the ones listed and the annotations they depend on.
+    ``materialized`` reads the stored outputs of the per-venue model, the
+    ``overall`` one is always computed.
+    '''
+    columns = PROB_COLUMNS if columns is None else columns
+    expected = expected_qry(date_filter, league, overall, bookmaker, list_all, kelly)
+    if materialized and not overall:
+        # outputs stored by predictions.refresh_predictions after every sync
+        prefix = 'odd__fixture__prediction__' if bookmaker or kelly else 'prediction__'
+        return expected.filter(**{f'{prefix}isnull': False})\
+            .annotate(**{column: F(f'{prefix}{column}') for column in columns})
+
+    stages = poisson_annotations()
+    needed = set(columns)
+    for stage in reversed(stages):
+        for name, expression in stage.items():
+            if name in needed:
+                needed |= _references(expression)
+    for stage in stages:
+        expected = expected.annotate(**{name: expression for name, expression in stage.items()
+                                        if name in needed})
+    return expected.filter(l_expected__isnull=False, v_expected__isnull=False)
+
+
+def poisson_records(fields: Sequence[str] = ('id',),
+                    date_filter: datetime | Tuple[datetime, datetime] | None = None,
+                    league: int | None = None, overall: bool = False,
+                    bookmaker: int | None = None, list_all: bool = False, kelly: bool = False,
+                    backend: str = POISSON_BACKEND) -> pd.DataFrame:
+    '''
+    ``poisson_model`` output as a DataFrame with ``fields``, the expected goal
+    inputs and every probability column. The ``sql`` backend evaluates the
+    annotate tree in the database, the ``numpy`` backend only pulls the
+    expected goals and computes the full score matrix in memory and the
+    ``stored`` backend reads the materialized predictions.
+    '''
+    columns = list(dict.fromkeys((*fields, *EXPECTED_COLUMNS)))
+    if backend in ('sql', 'stored'):
+        results = poisson_model(date_filter, league, overall, bookmaker, list_all, kelly,
+                                materialized=backend == 'stored')
+        return pd.DataFrame.from_records(results.values(*columns, *PROB_COLUMNS),
+                                         columns=[*columns, *PROB_COLUMNS])
+    if backend == 'numpy':
+        expected = expected_qry(date_filter, league, overall, bookmaker, list_all, kelly)
+        return poisson_frame(pd.DataFrame.from_records(expected.values(*columns), columns=columns))
+    raise ValueError(f'unknown poisson backend {backend}, expected one of {POISSON_BACKENDS}')
+
+def prob_names() -> tuple:
+    '''
+    Distinct probability columns referenced by the bet parameters, cached
+    for the current data version, which saving a parameter bumps.
+    '''
+    def compute():
+        referenced = set(BetParameter.objects.values_list('prob_name', flat=True).distinct())
+        return tuple(column for column in PROB_COLUMNS if column in referenced)
+    return cached('prob-names', compute)
+
 
 def kelly_function(bookmaker: int | None = None, league: int | None = None, overall: bool = False,
                 date_filter: datetime | Tuple[datetime, datetime] | None = None,
-                kelly_factor: float = 0.5, only_positives: bool = True, list_all: bool = False):
-    expected = poisson_model(date_filter, league, overall, bookmaker, list_all=list_all, kelly=True)
-    conditions = tuple(When(prob_name=par, then=F(par))
-                    for par in BetParameter.objects.values_list('prob_name', flat=True))
-    expected = expected.annotate(prob=Case(*conditions))
-    logger.info(f'recovered {expected.count()} bets')
+                kelly_factor: float = 0.5, only_positives: bool = True, list_all: bool = False,
+                materialized: bool = PREDICTIONS_MATERIALIZED):
+    names = prob_names()
+    expected = poisson_model(date_filter, league, overall, bookmaker, list_all=list_all, kelly=True,
+                             materialized=materialized, columns=names)
+    expected = expected.annotate(prob=Case(*(When(prob_name=name, then=F(name)) for name in names)))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'recovered {expected.count()} bets')
     expected = expected.filter(prob__gte=F('threshold'), prob_name=F('bet_pname'))
-    logger.info(f'...and filtered {expected.count()} records with high probs')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'...and filtered {expected.count()} records with high probs')
 
     def kelly_fn(factor=1.):
         kelly = (F('prob') * (F('value') + 1) - 1) / F('value')
@@ -248,6 +284,7 @@ def kelly_function(bookmaker: int | None = None, league: int | None = None, over
 
     result = expected.annotate(
         kelly=kelly_fn(kelly_factor),
+        fixture=F('odd__fixture'),
         flag=F('odd__fixture__season__league__country__flag'),
         home_badge=F('odd__fixture__home_team__logo'),
         away_badge=F('odd__fixture__away_team__logo')
@@ -0,0 +1,65 @@
+'''
+Vectorized Poisson scoring, same columns as ``poisson_f.poisson_model``
+'''
+import numpy as np
+import pandas as pd
+
+# goals published as l0..l8 / v0..v8 columns, same as the SQL model
+MAX_GOALS = 8
+# goals covered by the score matrix used for win / lose / draw
+TAIL_GOALS = 20
+
+PMF_COLUMNS = [f'{side}{k}' for side in 'lv' for k in range(MAX_GOALS + 1)]
+PROB_COLUMNS = [
+    *[f'l{k}' for k in range(MAX_GOALS + 1)], 'l_over',
+    *[f'v{k}' for k in range(MAX_GOALS + 1)], 'v_over',
+    *[f'al{k}' for k in range(MAX_GOALS + 1)],
+    *[f'av{k}' for k in range(MAX_GOALS + 1)],
+    'win', 'lose', 'draw',
+    *[f'l_{k}5' for k in range(1, MAX_GOALS + 1)],
+    *[f'v_{k}5' for k in range(1, MAX_GOALS + 1)],
+    'o_05',
+    ]
+
+
+def poisson_pmf(expected: np.ndarray, goals: int = TAIL_GOALS) -> np.ndarray:
+    '''P(k goals) for k in 0..goals, one row per expected value'''
+    expected = np.asarray(expected, dtype=float)[:, None]
+    ratios = np.broadcast_to(expected / np.arange(1, goals + 1), (len(expected), goals))
+    pmf = np.empty((len(expected), goals + 1))
+    pmf[:, 0] = np.exp(-expected[:, 0])
+    pmf[:, 1:] = pmf[:, :1] * np.cumprod(ratios, axis=1)
+    return pmf
+
+
+def poisson_probs(l_expected: np.ndarray, v_expected: np.ndarray,
+                  goals: int = TAIL_GOALS) -> dict[str, np.ndarray]:
+    l_pmf, v_pmf = poisson_pmf(l_expected, goals), poisson_pmf(v_expected, goals)
+    l_cdf, v_cdf = l_pmf.cumsum(axis=1), v_pmf.cumsum(axis=1)
+
+    probs = {}
+    for k in range(MAX_GOALS + 1):
+        probs[f'l{k}'], probs[f'v{k}'] = l_pmf[:, k], v_pmf[:, k]
+        probs[f'al{k}'], probs[f'av{k}'] = l_cdf[:, k], v_cdf[:, k]
+    probs['l_over'] = 1 - l_cdf[:, MAX_GOALS]
+    probs['v_over'] = 1 - v_cdf[:, MAX_GOALS]
+    probs['win'] = (l_pmf[:, 1:] * v_cdf[:, :-1]).sum(axis=1)
+    probs['lose'] = (v_pmf[:, 1:] * l_cdf[:, :-1]).sum(axis=1)
+    probs['draw'] = (l_pmf * v_pmf).sum(axis=1)
+    for k in range(1, MAX_GOALS + 1):
+        probs[f'l_{k}5'] = 1 - l_cdf[:, k]
+        probs[f'v_{k}5'] = 1 - v_cdf[:, k]
+    probs['o_05'] = 1 - l_pmf[:, 0] * v_pmf[:, 0]
+    return probs
+
+
+def poisson_frame(expected: pd.DataFrame, goals: int = TAIL_GOALS) -> pd.DataFrame:
+    '''
+    Adds the model columns to a frame holding ``l_expected`` and
+    ``v_expected``, dropping the rows the SQL model would not return.
+    '''
+    expected = expected.dropna(subset=['l_expected', 'v_expected'])
+    probs = poisson_probs(expected.l_expected.to_numpy(float),
+                          expected.v_expected.to_numpy(float), goals)
+    probs = pd.DataFrame(probs, index=expected.index)[PROB_COLUMNS]
+    return pd.concat((expected.drop(columns=PROB_COLUMNS, errors='ignore'), probs), axis=1)
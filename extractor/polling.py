@@ -0,0 +1,104 @@
+'''
+Kickoff-aware polling of the odds and the in-play fixtures
+'''
+import logging
+import os
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from extractor.models import BookMaker, Fixture
+from extractor.poisson_f import INPLAY_STATUS
+
+logger = logging.getLogger(__name__)
+
+# seconds between polls of a fixture by distance to kick off
+POLL_WEEK_SECONDS = int(os.environ.get('POLL_WEEK_SECONDS', 60 * 60))
+POLL_MATCH_DAY_SECONDS = int(os.environ.get('POLL_MATCH_DAY_SECONDS', 5 * 60))
+POLL_LIVE_SECONDS = int(os.environ.get('POLL_LIVE_SECONDS', 60))
+# fixtures further than this are left to the season wide sync
+POLL_HORIZON = timedelta(days=7)
+# fixtures still not finished this long after kick off are given up
+POLL_GRACE = timedelta(hours=6)
+# how long a round holds the fixtures it claimed, then they are due again
+POLL_CLAIM_SECONDS = int(os.environ.get('POLL_CLAIM_SECONDS', 15 * 60))
+
+SCHEDULED_STATUS = ('TBD', 'NS')
+LIVE_STATUS = tuple(status for status in INPLAY_STATUS if status not in SCHEDULED_STATUS)
+
+
+def is_live(kickoff: datetime, status: str, now: datetime):
+    '''in play, or past its kick off without the status telling it yet'''
+    return status in LIVE_STATUS or kickoff <= now
+
+
+def poll_interval(kickoff: datetime, status: str, now: datetime) -> timedelta:
+    '''time until the next poll of a fixture'''
+    if is_live(kickoff, status, now):
+        return timedelta(seconds=POLL_LIVE_SECONDS)
+    if kickoff - now <= timedelta(days=1):
+        # never sleep past the kick off
+        return min(timedelta(seconds=POLL_MATCH_DAY_SECONDS), kickoff - now)
+    if kickoff - now <= POLL_HORIZON:
+        return min(timedelta(seconds=POLL_WEEK_SECONDS), kickoff - now - timedelta(days=1))
+    return kickoff - now - POLL_HORIZON
+
+
+def due_fixtures(now: datetime):
+    '''synced fixtures not finished within the horizon whose next poll is due'''
+    return Fixture.objects.filter(
+        season__league__sync_on=True,
+        status_short__in=INPLAY_STATUS,
+        date__gte=now - POLL_GRACE,
+        date__lte=now + POLL_HORIZON,
+        ).filter(Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=now))
+
+
+def claim_due(now: datetime):
+    '''
+    Due fixtures as ``(id, date, status_short, league, season year)``,
+    claimed for this round: rows locked by another round are skipped and
+    the claimed ones are pushed POLL_CLAIM_SECONDS ahead, so overlapping
+    rounds never fetch them twice.
+    '''
+    with transaction.atomic():
+        due = list(due_fixtures(now).select_for_update(skip_locked=True, of=('self',))
+                   .values_list('id', 'date', 'status_short', 'season__league', 'season__year'))
+        Fixture.objects.filter(id__in=[fixture for fixture, *_ in due])\
+            .update(next_poll_at=now + timedelta(seconds=POLL_CLAIM_SECONDS))
+    return due
+
+
+def poll(api, now: datetime | None = None):
+    '''
+    One polling round: in-play fixtures are refreshed by id, the odds of
+    the upcoming ones are paged by league and match day and loaded for the
+    synced bookmakers. Every polled fixture is then scheduled from its
+    distance to kick off. ``since`` holds the leagues with new results.
+    '''
+    now = now or timezone.now()
+    due = claim_due(now)
+    live, upcoming = [], {}
+    for fixture, kickoff, status, league, year in due:
+        if is_live(kickoff, status, now):
+            live.append(fixture)
+        else:
+            upcoming.setdefault((league, year, kickoff.date().isoformat()), set()).add(fixture)
+
+    result = {'due': len(due), 'live': len(live), 'upcoming': sum(map(len, upcoming.values()))}
+    if live:
+        refreshed = api.refresh_fixtures(live)
+        result['fixtures'] = refreshed['create'] + refreshed['update']
+        result['since'] = refreshed['since']
+    if upcoming:
+        bookmakers = BookMaker.objects.filter(sync_on=True).values_list('id', flat=True)
+        result['odds'] = api.get_fixture_odds(upcoming, list(bookmakers))
+
+    # scheduled from the refreshed status, finished fixtures drop out of the due set
+    polled = list(Fixture.objects.filter(id__in=[fixture for fixture, *_ in due])
+                  .only('id', 'date', 'status_short'))
+    for fixture in polled:
+        fixture.next_poll_at = now + poll_interval(fixture.date, fixture.status_short, now)
+    Fixture.objects.bulk_update(polled, ['next_poll_at'], batch_size=500)
+    logger.info(f'polled {result["live"]} live and {result["upcoming"]} upcoming fixtures')
+    return result
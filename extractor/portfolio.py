@@ -0,0 +1,122 @@
+'''
+Simultaneous Kelly stakes of the value bets
+'''
+import os
+import re
+from functools import cache
+import numpy as np
+import pandas as pd
+from extractor.poisson_np import MAX_GOALS, TAIL_GOALS, poisson_pmf
+
+# joint outcomes of the fixtures enumerated up to this many, sampled beyond
+KELLY_SCENARIOS = int(os.environ.get('KELLY_SCENARIOS', 4096))
+
+
+@cache
+def outcome_mask(prob_name: str, goals: int = TAIL_GOALS) -> np.ndarray:
+    '''scores (home, away) of the 0..goals grid where the ``prob_name`` market wins'''
+    home, away = np.indices((goals + 1, goals + 1))
+    if prob_name in ('win', 'lose', 'draw', 'o_05'):
+        return {'win': home > away, 'lose': home < away, 'draw': home == away,
+                'o_05': home + away > 0}[prob_name]
+    side, cumulative, kind, k = re.fullmatch(r'(a?)([lv])(_?)(\d+|over)', prob_name).group(2, 1, 3, 4)
+    goals_ = home if side == 'l' else away
+    if k == 'over':
+        return goals_ > MAX_GOALS
+    if kind:
+        # l_25 is over 2.5 goals of the local team
+        return goals_ > int(k[:-1])
+    return goals_ <= int(k) if cumulative else goals_ == int(k)
+
+
+def _project(stakes: np.ndarray, budget: float) -> np.ndarray:
+    '''euclidean projection on the stakes >= 0 with sum <= budget'''
+    stakes = np.clip(stakes, 0, None)
+    if stakes.sum() <= budget:
+        return stakes
+    ordered = np.sort(stakes)[::-1]
+    excess = np.cumsum(ordered) - budget
+    rho = np.flatnonzero(ordered - excess / np.arange(1, len(ordered) + 1) > 0)[-1]
+    return np.clip(stakes - excess[rho] / (rho + 1), 0, None)
+
+
+def _scenarios(wins, probs, group, scenarios, rng):
+    '''
+    Returns of every bet (scenarios x bets, as win flags) in the joint
+    outcomes of the independent fixtures and the weight of each outcome.
+    The score grid of a fixture is reduced to the distinct win patterns of
+    its bets, their product is enumerated when it has at most
+    ``scenarios`` outcomes and sampled otherwise.
+    '''
+    fixtures = []
+    for fixture in range(len(probs)):
+        bets = np.flatnonzero(group == fixture)
+        patterns, inverse = np.unique(wins[bets].T, axis=0, return_inverse=True)
+        fixtures.append((bets, patterns, np.bincount(inverse.ravel(), weights=probs[fixture])))
+    sizes = [len(patterns) for _, patterns, _ in fixtures]
+    if np.prod(sizes, dtype=float) <= scenarios:
+        picks = np.unravel_index(np.arange(int(np.prod(sizes))), sizes)
+        weights = np.prod([weights[pick] for (*_, weights), pick in zip(fixtures, picks)], axis=0)
+    else:
+        rng = np.random.default_rng(rng)
+        picks = [rng.choice(len(weights), scenarios, p=weights / weights.sum())
+                 for *_, weights in fixtures]
+        weights = np.full(scenarios, 1 / scenarios)
+    won = np.zeros((len(weights), len(group)), dtype=bool)
+    for (bets, patterns, _), pick in zip(fixtures, picks):
+        won[:, bets] = patterns[pick]
+    return won, weights
+
+
+def _growth(stakes, returns, weights):
+    wealth = 1 + returns @ stakes
+    if (wealth[weights > 0] <= 0).any():
+        return -np.inf, wealth
+    return float(weights @ np.log(wealth)), wealth
+
+
+def optimize_kelly(candidates: pd.DataFrame, budget: float = 1., factor: float = 1.,
+                   by: str = 'fixture', goals: int = TAIL_GOALS,
+                   max_iter: int = 500, tol: float = 1e-9, scenarios: int = KELLY_SCENARIOS,
+                   rng: np.random.Generator | int | None = 0) -> pd.Series:
+    '''
+    Simultaneous Kelly stakes of ``candidates`` (``kelly_function`` rows
+    with ``by``, ``prob_name``, ``value``, ``l_expected`` and ``v_expected``)
+    as bankroll fractions summing to at most ``budget``. Bets on the same
+    fixture share its Poisson score grid, so exclusive or overlapping
+    markets are staked jointly, fixtures are taken as independent. The
+    expected log growth of the whole bankroll over the joint outcomes of
+    the fixtures, exact up to ``scenarios`` outcomes and sampled with
+    ``rng`` beyond, is maximised by projected gradient ascent and the
+    result scaled by ``factor`` for fractional Kelly. ``value`` is the net
+    odd, as in ``kelly_function``.
+    '''
+    if candidates.empty:
+        return pd.Series(dtype=float, index=candidates.index)
+    fixtures, group = np.unique(candidates[by].to_numpy(), return_inverse=True)
+    group = group.ravel()
+    first = candidates.groupby(group, sort=True)[['l_expected', 'v_expected']].first()
+    probs = (poisson_pmf(first.l_expected.to_numpy(float), goals)[:, :, None]
+             * poisson_pmf(first.v_expected.to_numpy(float), goals)[:, None, :])
+    probs = (probs / probs.sum(axis=(1, 2), keepdims=True)).reshape(len(fixtures), -1)
+    wins = np.stack([outcome_mask(name, goals).ravel() for name in candidates.prob_name])
+    won, weights = _scenarios(wins, probs, group, scenarios, rng)
+    returns = np.where(won, candidates.value.to_numpy(float), -1.)
+
+    stakes, step = np.zeros(len(candidates)), 1.
+    growth, wealth = _growth(stakes, returns, weights)
+    for _ in range(max_iter):
+        gradient = returns.T @ (weights / wealth)
+        while step > tol:
+            proposal = _project(stakes + step * gradient, budget)
+            proposed, proposed_wealth = _growth(proposal, returns, weights)
+            if proposed >= growth + 1e-4 * gradient @ (proposal - stakes):
+                break
+            step /= 2
+        else:
+            break
+        moved = np.abs(proposal - stakes).max()
+        stakes, growth, wealth, step = proposal, proposed, proposed_wealth, step * 2
+        if moved < tol:
+            break
+    return pd.Series(stakes * factor, index=candidates.index)
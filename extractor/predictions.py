@@ -0,0 +1,46 @@
+'''
+Materialized Poisson model outputs
+'''
+import logging
+from datetime import datetime
+from typing import Sequence
+import pandas as pd
+from django.db import transaction
+from extractor.models import Prediction
+from extractor.poisson_f import EXPECTED_COLUMNS, fixture_qry
+from extractor.poisson_np import PROB_COLUMNS, poisson_frame
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_FIELDS = [*EXPECTED_COLUMNS, *PROB_COLUMNS]
+
+
+def refresh_predictions(league: int | None = None, since: datetime | None = None,
+                        fixtures: Sequence[int] | None = None, batch_size: int = 500):
+    '''
+    Store the model outputs of the synced fixtures, optionally only of a
+    league, of the fixtures played from ``since`` on or of a list of ids.
+    Fixtures in scope that the model no longer covers lose their prediction.
+    '''
+    expected = fixture_qry(league=league, list_all=True)
+    scope = Prediction.objects.all()
+    if league is not None:
+        scope = scope.filter(fixture__season__league=league)
+    if since is not None:
+        expected = expected.filter(date__gte=since)
+        scope = scope.filter(fixture__date__gte=since)
+    if fixtures is not None:
+        expected = expected.filter(id__in=fixtures)
+        scope = scope.filter(fixture__in=fixtures)
+
+    columns = ['id', *EXPECTED_COLUMNS]
+    df = poisson_frame(pd.DataFrame.from_records(expected.values(*columns), columns=columns))
+    models = [Prediction(fixture_id=row.pop('id'), **row)
+              for row in df[['id', *PREDICTION_FIELDS]].to_dict('records')]
+    with transaction.atomic():
+        deleted, _ = scope.exclude(fixture__in=df.id.tolist()).delete()
+        Prediction.objects.bulk_create(
+            models, batch_size=batch_size, update_conflicts=True,
+            unique_fields=['fixture'], update_fields=['updated', *PREDICTION_FIELDS])
+    logger.info(f'predictions: {len(models)} stored, {deleted} removed')
+    return {'stored': len(models), 'removed': deleted}
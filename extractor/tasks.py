@@ -1,16 +1,29 @@
 from extractor.models import (BookMaker, Country, League, Fixture,
                               OddValues, Season, Bet, BetParameter)
-from extractor.apifootball.api_etl import ApiFootball, calculate_avg
-from celery import shared_task
+from extractor.apifootball.api_etl import ApiFootball
+from extractor.averages import calculate_league_avg
+from extractor.cache import bump_data_version
+from extractor.polling import poll
+from extractor.predictions import refresh_predictions
+from celery import chord, group, shared_task
+from celery.result import GroupResult
+from datetime import datetime
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# statistics batches downloaded by a task before it enqueues the next one
+STATS_BATCHES_PER_TASK = int(os.environ.get('STATS_BATCHES_PER_TASK', 20))
+
+
 @shared_task
 def sync_countries():
     api = ApiFootball()
     response = api.get_countries()
     logger.info(api.api.request_counter)
+    logger.info(api.api.cache_counter)
+    bump_data_version()
     return response
 
 
@@ -21,7 +34,9 @@ def sync_leagues():
         api.get_leagues(country)
 
     logger.info(api.api.request_counter)
+    logger.info(api.api.cache_counter)
     Season.objects.filter(current=True).update(sync_on=True)
+    bump_data_version()
 
 
 @shared_task
@@ -30,20 +45,89 @@ def sync_teams():
     for league in League.objects.filter(sync_on=True).values_list('id', flat=True):
         api.get_teams(league)
     logger.info(api.api.request_counter)
+    logger.info(api.api.cache_counter)
+    bump_data_version()
+
+
+def report_progress(task, **meta):
+    # update_state needs a task id, direct calls run without one
+    if task.request.id:
+        task.update_state(state='PROGRESS', meta=meta)
+
+
+@shared_task(bind=True)
+def sync_league_fixtures(self, league, sync_stats=False, full=False, backfill=False):
+    '''
+    Delta sync of the fixtures of a league around today, ``backfill``
+    downloads its whole current season.
+    '''
+    api = ApiFootball()
+    saved = api.get_fixtures(league, backfill)
+    report_progress(self, league=league, fixtures=saved['create'] + saved['update'])
+    if sync_stats:
+        # checkpointed batches in their own tasks, not inside the chord header
+        sync_fixture_stats.delay(league, None, backfill)
+    logger.info(api.api.request_counter)
+    logger.info(api.api.cache_counter)
+    return {'league': league, 'full': full,
+            'create': saved['create'], 'update': saved['update'],
+            'since': saved['since'].isoformat() if saved['since'] else None}
+
+
+@shared_task(bind=True)
+def sync_fixture_stats(self, league, after=None, backfill=False):
+    '''
+    Statistics of a league in checkpointed batches, enqueues itself again
+    from the last checkpoint until every fixture has been requested.
+    '''
+    api = ApiFootball()
+    result = api.get_fixture_stats(league, after, backfill, max_batches=STATS_BATCHES_PER_TASK,
+                                   progress=lambda result: report_progress(self, league=league, **result))
+    logger.info(api.api.request_counter)
+    logger.info(api.api.cache_counter)
+    if result['after'] is not None:
+        sync_fixture_stats.delay(league, result['after'], backfill)
+    return result
 
 
 @shared_task
-def sync_fixtures(sync_stats=False):
+def finish_sync_fixtures(results):
+    '''chord callback, averages and predictions of the leagues with new results'''
+    for result in results:
+        if not result['full'] and not result['since']:
+            continue
+        since = None if result['full'] else datetime.fromisoformat(result['since'])
+        calculate_league_avg(result['league'], since=since)
+        refresh_predictions(result['league'], since)
+    bump_data_version()
+    return results
+
+
+@shared_task
+def sync_fixtures(sync_stats=False, full=False, backfill=False):
+    leagues = League.objects.filter(sync_on=True).values_list('id', flat=True)
+    header = group(sync_league_fixtures.s(league, sync_stats, full, backfill) for league in leagues)
+    result = chord(header)(finish_sync_fixtures.s())
+    # the header group is what sync_progress follows, the callback runs last
+    result.parent.save()
+    return result.parent.id
+
+
+@shared_task(bind=True)
+def sync_league_odds(self, league, season, bookmaker):
     api = ApiFootball()
-    saved = None
-    for league in League.objects.filter(sync_on=True).values_list('id', flat=True):
-        saved = api.get_fixtures(league)
-        for fixture in Fixture.objects.filter(season__league=league):
-            calculate_avg(fixture)
-        if sync_stats:
-            api.get_fixture_stats(league)
+    result = api.get_odds(league, season, bookmaker,
+                          progress=lambda result: report_progress(self, **result))
     logger.info(api.api.request_counter)
-    return saved
+    logger.info(api.api.cache_counter)
+    return result
+
+
+@shared_task
+def finish_sync_odds(results):
+    '''chord callback, the caches are flushed once every league is loaded'''
+    bump_data_version()
+    return results
 
 
 @shared_task
@@ -51,10 +135,48 @@ def sync_odds():
     api = ApiFootball()
     api.get_bookmakers()
     api.get_bets()
-    for season, league in Season.objects.select_related('league').filter(sync_on=True, league__sync_on=True).values_list('id', 'league__id'):
-        for bookmaker in BookMaker.objects.filter(sync_on=True).values_list('id', flat=True):
-            api.get_odds(league, season, bookmaker)
-    logger.info(api.api.request_counter)
+    bookmakers = BookMaker.objects.filter(sync_on=True).values_list('id', flat=True)
+    header = group(sync_league_odds.s(league, season, bookmaker)
+                   for season, league in Season.objects.select_related('league').filter(sync_on=True, league__sync_on=True).values_list('id', 'league__id')
+                   for bookmaker in bookmakers)
+    result = chord(header)(finish_sync_odds.s())
+    result.parent.save()
+    return result.parent.id
+
+
+@shared_task
+def poll_fixtures():
+    '''
+    Polls the fixtures that are due, meant to run every POLL_LIVE_SECONDS
+    from beat. Rounds with nothing due make no request.
+    '''
+    api = ApiFootball(cache=False)
+    result = poll(api)
+    # the next delta sync finds these results stored, their averages are due now
+    for league, since in result.pop('since', {}).items():
+        calculate_league_avg(league, since=since)
+        refresh_predictions(league, since)
+    if result['due']:
+        logger.info(api.api.request_counter)
+    # rounds run every minute on match days, the caches are only flushed
+    # when one stored something
+    odds = result.get('odds', {})
+    if result.get('fixtures') or any(odds.get(key) for key in ('odds', 'values', 'history')):
+        bump_data_version()
+    return result
+
+
+def sync_progress(group_id):
+    '''completed, failed and running subtasks of a sync group'''
+    result = GroupResult.restore(group_id)
+    if result is None:
+        return None
+    return {
+        'total': len(result.results),
+        'completed': result.completed_count(),
+        'failed': sum(1 for task in result.results if task.failed()),
+        'running': {task.id: task.info for task in result.results if task.state == 'PROGRESS'},
+        }
 
 
 @shared_task
@@ -1,12 +1,15 @@
 from django.shortcuts import render
 from django.http.response import HttpResponse
 from .tasks import sync_countries, sync_leagues, sync_teams, sync_fixtures, sync_odds
-from extractor.poisson_f import poisson_model, kelly_function
+from extractor.poisson_f import poisson_model, poisson_records, kelly_function, POISSON_BACKEND
 from extractor.models import Stats
+from extractor.averages import stats_features
+from extractor.cache import cache_view, cached
+from extractor.portfolio import optimize_kelly
 from datetime import datetime, timedelta, timezone
+from django.utils.timezone import now
 import pandas as pd
 from pretty_html_table import build_table
-from random import random
 
 def kelly_fn(x, odd=1, factor = 0.5):
     kelly = (x * (odd + 1) - 1) / odd * factor
@@ -22,30 +25,23 @@ def sync(request):
     return render(request, 'sync.html')
 
 
+@cache_view()
 def probs_view(request, kelly: bool = False):
-    results = poisson_model((datetime(2020, 1, 1, tzinfo=timezone.utc), datetime(2030, 1, 1, tzinfo=timezone.utc)))
-    stats = Stats.objects.filter(fixture__in=results)
+    df = poisson_records(
+        ('id', 'date',
+         'country', 'season__league', 'season__league__name', 'season__year',
+         'home_team__name', 'away_team__name',
+         'home_goals', 'away_goals',
+         'home_favor_goals_avg', 'home_against_goals_avg',
+         'away_favor_goals_avg', 'away_against_goals_avg',
+         'home_league_goals_avg', 'away_league_goals_avg',
+         'home_n', 'away_n', 'league_n'),
+        (datetime(2020, 1, 1, tzinfo=timezone.utc), datetime(2030, 1, 1, tzinfo=timezone.utc)),
+        backend=request.GET.get('backend', POISSON_BACKEND))
+    stats = Stats.objects.filter(fixture__in=df.id.tolist())
     stats_df = pd.DataFrame.from_records(stats.values())
-    records = results.values(
-        'id', 'date',
-        'country', 'season__league__name', 'season__year',
-        'home_team__name', 'away_team__name',
-        'home_goals', 'away_goals',
-        'home_favor_goals_avg', 'home_against_goals_avg',
-        'away_favor_goals_avg', 'away_against_goals_avg',
-        'home_league_goals_avg', 'away_league_goals_avg',
-        'home_n', 'away_n', 'league_n',
-        'l_attack', 'l_defense', 'v_attack', 'v_defense',
-        'l_expected', 'v_expected',
-        'l0', 'l1', 'l2', 'l3', 'l4', 'l5', 'l6', 'l7', 'l8', 'l_over',
-        'v0', 'v1', 'v2', 'v3', 'v4', 'v5', 'v6', 'v7', 'v8', 'v_over',
-        'al0', 'al1', 'al2', 'al3', 'al4', 'al5', 'al6', 'al7', 'al8',
-        'av0', 'av1', 'av2', 'av3', 'av4', 'av5', 'av6', 'av7', 'av8',
-        'win', 'lose', 'draw',
-        'l_15', 'l_25', 'l_35', 'l_45', 'l_55', 'l_65', 'l_75', 'l_85',
-        'v_15', 'v_25', 'v_35', 'v_45', 'v_55', 'v_65', 'v_75', 'v_85',
-        )
-    df = pd.DataFrame.from_records(records).rename(columns={
+    features = [stats_features(league) for league in df.season__league.unique()]
+    df = df.drop(columns='season__league').rename(columns={
         'season__league__name': 'league',
         'season__year': 'season',
         'home_team__name': 'home',
@@ -77,6 +73,8 @@ def probs_view(request, kelly: bool = False):
             df[col] = df[col].apply(kelly_fn)
     if not stats_df.empty:
         df = df.merge(stats_df, left_on='id', right_on='fixture_id', how='left', suffixes=('', '_stats'))
+    if features:
+        df = df.merge(pd.concat(features), on='id', how='left')
     html_table = df.sort_values('date', ascending=False).to_html( index=False)
     return render(request, 'probs.html', context={
         'table': html_table
@@ -92,18 +90,12 @@ def kelly_view(request):
 def push_button(request):
     results = kelly_function(bookmaker=32, date_filter=(datetime(2020,1,1), datetime(2030,1,1)))
     df = pd.DataFrame.from_records(results.values())
-    dg = pd.DataFrame(columns=df.columns)
-    while dg.kelly.sum() < 1.:
-        df.loc[:, 'k0'] = df.kelly.cumsum() / df.kelly.sum()
-        df.loc[:, 'k1'] = df.k0.shift(fill_value=0)
-        r = random()
-        row = df.loc[(df.k1 < r) & (df.k0 >= r), :]
-        dg = pd.concat((dg, row))
-        df.drop(index=row.index, inplace=True)
-        df.drop(index=df.loc[df.kelly > 1 - dg.kelly.sum(), :].index)
-
-    output = dg[['id', 'kelly']]
-    output['kelly'] = output.kelly / output.kelly.sum() * 100
+    if not df.empty:
+        df['kelly'] = optimize_kelly(df, factor=1 / 2)
+    dg = df[df.kelly > 1e-4] if not df.empty else pd.DataFrame(columns=['id', 'kelly'])
+
+    output = dg[['id', 'kelly']].copy()
+    output['kelly'] = output.kelly * 100
     return render(request, 'button.html', context={'table': output.to_html()})
 
 
@@ -125,23 +117,24 @@ def render_widget(request):
     else:
         value= 10000
     kelly_columns = ['bookmaker', 'country', 'league', 'home', 'away', 'date', 'bet', 'key', 'kelly']
-    start_date, end_date = datetime.now() - timedelta(90), datetime.now() + timedelta(15)
-    results = kelly_function(date_filter=(start_date, end_date), kelly_factor=1 / 2)
-    df = pd.DataFrame.from_records(results.values())
-    dg = pd.DataFrame(columns=kelly_columns)
-    while dg.kelly.sum() < 1. and not df.empty:
-        df.loc[:, 'k0'] = df.kelly.cumsum() / df.kelly.sum()
-        df.loc[:, 'k1'] = df.k0.shift(fill_value=0)
-        r = random()
-        row = df.loc[(df.k1 < r) & (df.k0 >= r), :]
-        dg = pd.concat((dg, row)) if not dg.empty else pd.DataFrame(row)
-        df.drop(index=row.index, inplace=True)
-        df.drop(index=df.loc[df.kelly > 1 - dg.kelly.sum(), :].index)
-
-    output = dg[kelly_columns]
+
+    def window_bets():
+        # the window moves with the request, the key with its day
+        start = now()
+        return pd.DataFrame.from_records(kelly_function(
+            date_filter=(start - timedelta(90), start + timedelta(15)), kelly_factor=1 / 2).values())
+
+    # the query is shared by every visitor, the stakes are solved per request
+    df = cached(f'render_widget:kelly:{now().date()}', window_bets)
+    if not df.empty:
+        # joint stakes of the bets sharing a fixture, half Kelly
+        df['kelly'] = optimize_kelly(df, factor=1 / 2)
+    dg = df[df.kelly > 1e-4] if not df.empty else pd.DataFrame(columns=kelly_columns)
+
+    output = dg[kelly_columns].copy()
     if not output.empty:
         output.loc[:, ('date',)] = output.date.apply(lambda x: datetime.strftime(x, '%Y-%m-%d'))
-        output.loc[:, ('valor apuesta',)] = (output.kelly / output.kelly.sum() * value).apply(lambda x: f"$ {x:,.0f}")
+        output.loc[:, ('valor apuesta',)] = (output.kelly * value).apply(lambda x: f"$ {x:,.0f}")
         output = output.drop(columns=['kelly'])
 
     return render(request, 'bets_portal.html', 
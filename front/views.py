@@ -1,10 +1,11 @@
 from datetime import timedelta
 from django.shortcuts import render
 from extractor.models import Fixture
+from extractor.cache import cache_view
 from django.utils.timezone import now
 from extractor.poisson_f import kelly_function
+from extractor.portfolio import optimize_kelly
 import pandas as pd
-from random import random
 
 
 # Create your views here.
@@ -12,12 +13,13 @@ def main(request):
     return render(request, 'templates/main_single_panel.html')
 
 
+@cache_view()
 def next_table(request):
     fixtures = Fixture.objects.filter(
         season__sync_on=True,
         season__league__sync_on=True,
         season__league__country__sync_on=True,
-        status__short='NS',
+        status_short='NS',
         date__gte=now(),
         date__lte=now() + timedelta(4),
         home_team__isnull=False,
@@ -25,27 +27,24 @@ def next_table(request):
     return render(request, 'next_table.html', context={'fixtures': fixtures})
 
 def bets_table(request):
-    bet = request.GET.get('bet', 100000)
-    results = kelly_function(
-        date_filter=(now(), now() + timedelta(15)))
-    df = pd.DataFrame.from_records(results.values())
-    dg = pd.DataFrame(columns=df.columns)
-    while dg.kelly.sum() < 1.:
-        df.loc[:, 'k0'] = df.kelly.cumsum() / df.kelly.sum()
-        df.loc[:, 'k1'] = df.k0.shift(fill_value=0)
-        r = random()
-        row = df.loc[(df.k1 < r) & (df.k0 >= r), :]
-        dg = pd.concat((dg, row))
-        df.drop(index=row.index, inplace=True)
-        df.drop(index=df.loc[df.kelly > 1 - dg.kelly.sum(), :].index)
-
-    output = dg[[
+    bet = float(request.GET.get('bet', 100000))
+    columns = [
         'bookmaker', 'country', 'flag', 'league',
         'date', 'bet', 'key', 'value',
         'home', 'home_badge',
         'away', 'away_badge',
-        'kelly']]
-    output.loc[:, ('kelly',)] = output.kelly / output.kelly.sum() * bet
+        'kelly']
+    results = kelly_function(
+        date_filter=(now(), now() + timedelta(15)))
+    df = pd.DataFrame.from_records(results.values())
+    if not df.empty:
+        # joint stakes of the bets sharing a fixture, half Kelly
+        df['kelly'] = optimize_kelly(df, factor=1 / 2)
+    dg = df[df.kelly > 1e-4] if not df.empty else pd.DataFrame(columns=columns)
+
+    output = dg[columns].copy()
+    # stakes are bankroll fractions, what is not staked is kept
+    output.loc[:, ('kelly',)] = output.kelly * bet
     output.loc[:, ('expected',)] = output.kelly * output.value
     total = output.expected.sum()
-    return render(request, 'bets_table.html', context={'bets': output, 'total': total})
\ No newline at end of file
+    return render(request, 'bets_table.html', context={'bets': output, 'total': total})
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone
+from itertools import permutations
+from random import Random
+import pytest
+from django.core.cache import cache
+from extractor.models import Country, League, Season, Team, Fixture
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    '''cached responses and the data version must not leak between tests'''
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def no_response_cache(monkeypatch):
+    '''clients built by the tests never read or write the API-Football response cache'''
+    monkeypatch.setattr('extractor.apifootball.api_extractor.API_FOOTBALL_CACHE', '')
+
+
+@pytest.fixture
+def synthetic_league(db):
+    '''
+    Double round robin league with a finished past season and a current
+    season whose last round is still to be played.
+    '''
+    def build(teams: int = 6, league_id: int = 1, seed: int = 7):
+        rng = Random(seed)
+        country, _ = Country.objects.get_or_create(code='XX', defaults={'name': 'Synthetic'})
+        league = League.objects.create(id=league_id, name=f'league {league_id}', country=country,
+                                       sync_on=True)
+        team_models = Team.objects.bulk_create([
+            Team(id=league_id * 1000 + i, name=f'team {i}', country=country)
+            for i in range(teams)])
+        date = datetime(2024, 1, 1, 20, tzinfo=timezone.utc)
+        fixtures = []
+        for year, current in ((2024, False), (2025, True)):
+            season = Season.objects.create(id=f'{league_id}-{year}', year=year, coverage={},
+                                           league=league, current=current, sync_on=current)
+            pairs = list(permutations(team_models, 2))
+            rng.shuffle(pairs)
+            for i, (home, away) in enumerate(pairs):
+                played = not current or i < len(pairs) - teams // 2
+                fixtures.append(Fixture(
+                    id=league_id * 100000 + len(fixtures), date=date, season=season,
+                    home_team=home, away_team=away,
+                    home_goals=rng.randint(0, 4) if played else None,
+                    away_goals=rng.randint(0, 3) if played else None,
+                    periods={}, score={},
+                    status={'short': 'FT' if played else 'NS'},
+                    status_short='FT' if played else 'NS'))
+                # two fixtures share every kick off time
+                date += timedelta(days=i % 2)
+        Fixture.objects.bulk_create(fixtures)
+        return league
+    return build
@@ -0,0 +1,110 @@
+from datetime import timedelta
+from unittest.mock import patch
+from django.utils.timezone import now
+from rest_framework.test import APIClient
+import pytest
+from extractor.cache import bump_data_version
+from extractor.models import Bet, BookMaker, Country, Fixture, Odds, Team, Venue
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def fixtures(db):
+    country = Country.objects.create(code='XX', name='Synthetic', sync_on=True)
+    venues = Venue.objects.bulk_create(
+        Venue(id=i, name=f'venue {i}', country=country) for i in range(4))
+    teams = Team.objects.bulk_create(
+        Team(id=i, name=f'team {i}', country=country, venue=venues[i]) for i in range(4))
+    return Fixture.objects.bulk_create(
+        Fixture(id=i, date=now() + timedelta(days=1 + i), venue=venues[i % 4],
+                home_team=teams[i % 4], away_team=teams[(i + 1) % 4],
+                periods={}, status={'short': 'NS'}, status_short='NS', score={})
+        for i in range(8))
+
+
+@pytest.fixture
+def odds(fixtures):
+    bookmaker = BookMaker.objects.create(id=1, name='bookmaker', sync_on=True)
+    bet = Bet.objects.create(id=1, name='Match Winner', sync_on=True)
+    return Odds.objects.bulk_create(
+        Odds(bookmaker=bookmaker, bet=bet, fixture=fixture)
+        for fixture in fixtures)
+
+
+class TestQueryBudget:
+
+    @pytest.mark.django_db
+    def test_fixtures(self, client, fixtures, django_assert_max_num_queries):
+        with django_assert_max_num_queries(2):
+            response = client.get('/api/fixture/', {'format': 'json'})
+        assert response.status_code == 200
+        assert response.json()['results'][0]['home_team']['country']['code'] == 'XX'
+
+    @pytest.mark.django_db
+    def test_odds(self, client, odds, django_assert_max_num_queries):
+        with django_assert_max_num_queries(2):
+            response = client.get('/api/odd/', {'format': 'json'})
+        assert response.json()['count'] == len(odds)
+
+    @pytest.mark.django_db
+    def test_teams(self, client, fixtures, django_assert_max_num_queries):
+        with django_assert_max_num_queries(2):
+            response = client.get('/api/team/', {'format': 'json'})
+        assert response.json()['results'][0]['country']['name'] == 'Synthetic'
+
+
+class TestCompact:
+
+    @pytest.mark.django_db
+    def test_compact(self, client, fixtures, django_assert_max_num_queries):
+        with django_assert_max_num_queries(2):
+            response = client.get('/api/fixture/', {'format': 'json', 'compact': 1})
+        result = response.json()['results'][0]
+        assert result['home_team'] == fixtures[0].home_team_id
+        assert result['venue'] == fixtures[0].venue_id
+
+    @pytest.mark.django_db
+    def test_fields(self, client, fixtures):
+        response = client.get('/api/fixture/', {'format': 'json', 'compact': 1,
+                                                'fields': 'id,date,home_team'})
+        assert set(response.json()['results'][0]) == {'id', 'date', 'home_team'}
+
+
+class TestCachedLists:
+
+    @pytest.mark.django_db
+    def test_versioned(self, client, fixtures, django_assert_num_queries):
+        client.get('/api/country/', {'format': 'json'})
+        with django_assert_num_queries(0):
+            response = client.get('/api/country/', {'format': 'json'})
+        assert response.json()['count'] == 1
+
+        Country.objects.create(code='YY', name='Other', sync_on=True)
+        assert client.get('/api/country/', {'format': 'json'}).json()['count'] == 2
+
+    @pytest.mark.django_db
+    def test_bump(self, client, fixtures):
+        client.get('/api/fixture/', {'format': 'json'})
+        Fixture.objects.all().delete()
+        assert client.get('/api/fixture/', {'format': 'json'}).json()['count'] == len(fixtures)
+        bump_data_version()
+        assert client.get('/api/fixture/', {'format': 'json'}).json()['count'] == 0
+
+
+class TestSyncProgress:
+
+    @pytest.mark.django_db
+    def test_admin_only(self, client):
+        assert client.get('/api/sync/abc/', {'format': 'json'}).status_code in (401, 403)
+
+    @pytest.mark.django_db
+    def test_progress(self, client, admin_user):
+        client.force_authenticate(admin_user)
+        progress = {'total': 2, 'completed': 1, 'failed': 0, 'running': {}}
+        with patch('api.views.sync_progress', side_effect=lambda id: progress if id == 'abc' else None):
+            assert client.get('/api/sync/abc/', {'format': 'json'}).json() == progress
+            assert client.get('/api/sync/xyz/', {'format': 'json'}).status_code == 404
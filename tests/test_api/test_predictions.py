@@ -0,0 +1,73 @@
+from rest_framework.test import APIClient
+import pytest
+from extractor.averages import calculate_league_avg
+from extractor.models import Bet, BetParameter, BookMaker, Fixture, Odds, OddValues
+from extractor.predictions import refresh_predictions
+
+WINDOW = {'format': 'json', 'date_from': '2024-01-01T00:00:00Z', 'date_to': '2026-01-01T00:00:00Z'}
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def league(synthetic_league):
+    league = synthetic_league(teams=6)
+    calculate_league_avg(league.id)
+    refresh_predictions(league.id)
+    return league
+
+
+@pytest.fixture
+def value_bets(league):
+    bookmaker = BookMaker.objects.create(id=1, name='bookmaker', sync_on=True)
+    bet = Bet.objects.create(id=1, name='Match Winner', sync_on=True)
+    BetParameter.objects.create(id='1-Home', key='Home', bet=bet, prob_name='win')
+    for fixture in Fixture.objects.filter(home_goals__isnull=True):
+        odd = Odds.objects.create(bookmaker=bookmaker, bet=bet, fixture=fixture)
+        OddValues.objects.create(odd=odd, key='Home', prob_name='win', value=9.)
+    return bookmaker
+
+
+def pages(client, url, params):
+    response = client.get(url, params).json()
+    results = response['results']
+    while response['next']:
+        response = client.get(response['next']).json()
+        results.extend(response['results'])
+    return results
+
+
+class TestPredictions:
+
+    @pytest.mark.django_db
+    def test_cursor(self, client, league):
+        results = pages(client, '/api/prediction/', {**WINDOW, 'page_size': 1})
+        expected = Fixture.objects.filter(prediction__isnull=False, home_goals__isnull=True)
+        assert [result['id'] for result in results] == \
+            list(expected.order_by('date', 'id').values_list('id', flat=True))
+        assert 0 < results[0]['win'] < 1
+
+    @pytest.mark.django_db
+    def test_filters(self, client, league):
+        response = client.get('/api/prediction/', {**WINDOW, 'league': league.id + 1})
+        assert response.json()['results'] == []
+        assert client.get('/api/prediction/', {'date_from': 'tomorrow'}).status_code == 400
+        assert client.get('/api/prediction/', {**WINDOW, 'bookmaker': 32}).status_code == 400
+
+    @pytest.mark.django_db
+    def test_fields(self, client, league):
+        response = client.get('/api/prediction/', {**WINDOW, 'fields': 'id,win,draw,lose'})
+        assert set(response.json()['results'][0]) == {'id', 'win', 'draw', 'lose'}
+
+
+class TestValueBets:
+
+    @pytest.mark.django_db
+    def test_value_bets(self, client, value_bets):
+        results = pages(client, '/api/valuebet/', {**WINDOW, 'bookmaker': value_bets.id, 'page_size': 2})
+        assert len(results) == OddValues.objects.count()
+        assert all(result['kelly'] > 0 and result['bookmaker'] == 'bookmaker' for result in results)
+        assert sorted(result['id'] for result in results) == sorted(OddValues.objects.values_list('pk', flat=True))
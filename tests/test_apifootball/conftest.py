@@ -45,15 +45,15 @@ def bet():
 @pytest.fixture
 def odds(bookmaker, bet, fixture):
     odds = Odds(
-        id='odd', bookmaker=bookmaker,
+        bookmaker=bookmaker,
         bet=bet, fixture=fixture)
     odds.save()
 
     values = OddValues(
-        id='values', odd=Odds.objects.get(id='odd'),
+        odd=odds,
         key='home', value=10.)
     values.save()
-    return OddValues.objects.get(id='values')
+    return OddValues.objects.get(pk=values.pk)
 
 @pytest.fixture
 def extractor():
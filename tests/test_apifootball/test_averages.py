@@ -0,0 +1,108 @@
+import pytest
+from extractor.apifootball.api_etl import calculate_avg, changed_results
+import random
+from extractor.averages import AVERAGE_FIELDS, STATS_COLUMNS, calculate_league_avg, stats_features
+from extractor.models import Fixture, Stats
+
+
+@pytest.fixture
+def league(synthetic_league):
+    return synthetic_league(teams=6)
+
+
+def expected_averages(league):
+    expected = {}
+    for fixture in Fixture.objects.filter(season__league=league):
+        calculate_avg(fixture)
+    for values in Fixture.objects.filter(season__league=league).values('id', *AVERAGE_FIELDS):
+        expected[values.pop('id')] = values
+    Fixture.objects.update(**{field: None for field in AVERAGE_FIELDS})
+    return expected
+
+
+class TestLeagueAverages:
+
+    @pytest.mark.django_db
+    def test_parity(self, league):
+        expected = expected_averages(league)
+        assert calculate_league_avg(league.id) == len(expected)
+        for values in Fixture.objects.filter(season__league=league).values('id', *AVERAGE_FIELDS):
+            for field in AVERAGE_FIELDS:
+                assert values[field] == pytest.approx(expected[values['id']][field]), field
+
+    @pytest.mark.django_db
+    def test_season(self, league):
+        calculate_league_avg(league.id, season=f'{league.id}-2025')
+        assert not Fixture.objects.filter(season__year=2024, league_n__isnull=False).exists()
+        assert not Fixture.objects.filter(season__year=2025, league_n__isnull=True).exists()
+
+    @pytest.mark.django_db
+    def test_single_update(self, league, django_assert_max_num_queries):
+        with django_assert_max_num_queries(3):
+            calculate_league_avg(league.id)
+
+    @pytest.mark.django_db
+    def test_incremental(self, league):
+        calculate_league_avg(league.id)
+        fixture = Fixture.objects.filter(season__league=league, home_goals__isnull=True)\
+            .order_by('date').first()
+        Fixture.objects.filter(pk=fixture.pk).update(home_goals=2, away_goals=1)
+        later = Fixture.objects.filter(season__league=league, date__gte=fixture.date).count()
+        assert 0 < calculate_league_avg(league.id, since=fixture.date) <= later
+        assert calculate_league_avg(league.id) == 0
+
+
+class TestChangedResults:
+
+    @pytest.mark.django_db
+    def test_changed_results(self, league):
+        models = list(Fixture.objects.filter(season__league=league).order_by('date'))
+        assert changed_results(models) == ([], None)
+
+        models[-1].home_goals, models[-1].away_goals = 1, 1
+        models[-1].status = {'short': 'FT'}
+        models.append(Fixture(id=1, date='2026-01-01T20:00:00+00:00', status={}))
+        changed, since = changed_results(models)
+        assert changed == [models[-2].pk, 1]
+        assert since == models[-2].date
+
+
+@pytest.fixture
+def league_stats(league):
+    rng = random.Random(3)
+    fixtures = Fixture.objects.filter(season__league=league, home_goals__isnull=False)
+    Stats.objects.bulk_create(Stats(fixture=fixture, **{
+        f'{side}_{column}': None if rng.random() < .1 else rng.randint(0, 20)
+        for column in STATS_COLUMNS for side in ('home', 'away')}) for fixture in fixtures)
+    return league
+
+
+class TestStatsFeatures:
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize('n', [None, 3])
+    def test_parity(self, league_stats, n, monkeypatch):
+        if n is None:
+            features = stats_features(league_stats.id)
+        else:
+            # the properties and the features share the window
+            monkeypatch.setattr('extractor.models.AVERAGES_OVER_LAST_N_MATCHES', n)
+            features = stats_features(league_stats.id, n=n)
+        features = features.set_index('id')
+        properties = [name for name in dir(Stats) if name.startswith('f_')]
+        assert properties
+        for stats in Stats.objects.select_related('fixture'):
+            for name in properties:
+                expected = getattr(stats, name)
+                value = features.loc[stats.fixture_id, name[2:]]
+                if expected is None:
+                    assert value != value, name
+                else:
+                    assert value == pytest.approx(expected), name
+
+    @pytest.mark.django_db
+    def test_queries(self, league_stats, django_assert_num_queries):
+        with django_assert_num_queries(2):
+            features = stats_features(league_stats.id, season=f'{league_stats.id}-2025')
+        assert len(features) == Fixture.objects.filter(season__year=2025).count()
+        assert features.filter(like='_avg').notna().any().all()
@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from extractor.apifootball.api_cache import ResponseCache
+from extractor.apifootball.api_extractor import ApiExtractor, SharedQuota, TokenBucket
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    delay = .2
+    ports = set()
+
+    def do_GET(self):
+        self.ports.add(self.client_address[1])
+        time.sleep(self.delay)
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        errors = {'token': 'invalid'} if 'errors' in self.path else []
+        page = int(parse_qs(urlparse(self.path).query).get('page', [1])[0])
+        items = [] if 'empty' in self.path else [{'path': self.path}]
+        body = json.dumps({'errors': errors, 'results': len(items),
+                           'paging': {'current': page, 'total': 3 if 'odds' in self.path else 1},
+                           'response': items}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StubHandler.ports = set()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/'
+    server.shutdown()
+
+
+@pytest.fixture
+def stub(server, monkeypatch):
+    extractor = ApiExtractor(cache=False)
+    extractor.url_base = server
+    monkeypatch.setattr(extractor, 'limiter', TokenBucket(1000., 10))
+    return extractor
+
+
+class TestTokenBucket:
+
+    def test_rate(self):
+        bucket = TokenBucket(rate=20., capacity=2)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # two tokens of burst, then one every 50 ms
+        assert time.monotonic() - start == pytest.approx(.2, abs=.05)
+
+    def test_threads(self):
+        bucket = TokenBucket(rate=50., capacity=1)
+        start = time.monotonic()
+        threads = [threading.Thread(target=bucket.acquire) for _ in range(11)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.monotonic() - start == pytest.approx(.2, abs=.05)
+
+
+class TestSharedQuota:
+
+    def test_next_minute(self, monkeypatch):
+        clock = [600.5]
+        monkeypatch.setattr('extractor.apifootball.api_extractor.time.time', lambda: clock[0])
+        monkeypatch.setattr('extractor.apifootball.api_extractor.time.sleep',
+                            lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+        quota = SharedQuota(2)
+        assert [quota.acquire() for _ in range(2)] == [0., 0.]
+        assert quota.acquire() == pytest.approx(59.5)
+        # a second process shares the counter through the cache
+        assert SharedQuota(2).acquire() == 0.
+        assert SharedQuota(2).acquire() == pytest.approx(60.)
+
+
+class TestPooledClient:
+
+    def test_fetch(self, stub):
+        response = stub.fetch('fixtures', league=1)
+        assert response['response'][0]['path'] == '/fixtures?league=1'
+        assert stub.ok
+        assert stub.request_counter == {'fixtures': 1}
+
+    def test_errors(self, stub):
+        stub.fetch('errors')
+        assert stub.errors == ['invalid']
+
+    def test_keep_alive(self, stub):
+        for _ in range(3):
+            stub.get('countries')
+        assert len(StubHandler.ports) == 1
+
+    def test_map(self, stub):
+        start = time.monotonic()
+        responses = list(stub.map(lambda league: stub.get_fixtures(league, 2025), range(8),
+                                  workers=4))
+        # four workers, two rounds of 200 ms
+        assert time.monotonic() - start < 8 * StubHandler.delay / 2
+        assert [r['response'][0]['path'] for r in responses] == \
+            [f'/fixtures?league={league}&season=2025' for league in range(8)]
+        assert stub.request_counter == {'fixtures': 8}
+
+    def test_map_rate_limit(self, stub, monkeypatch):
+        monkeypatch.setattr(stub, 'limiter', TokenBucket(10., 1))
+        start = time.monotonic()
+        list(stub.map(lambda league: stub.get_fixtures(league, 2025), range(5), workers=5))
+        assert time.monotonic() - start >= .4
+
+
+class TestPagination:
+
+    def test_pages(self, stub):
+        pages = [page['paging']['current'] for page in stub.iter_odds(1, 2025, 32)]
+        assert pages == [1, 2, 3]
+        assert stub.request_counter == {'odds': 3}
+
+    def test_prefetch(self, stub):
+        start = time.monotonic()
+        for _ in stub.iter_odds(1, 2025, 32):
+            time.sleep(StubHandler.delay)
+        # the next page downloads while the current one is processed
+        assert time.monotonic() - start < 6 * StubHandler.delay
+
+    def test_fetch_all(self, stub):
+        response = stub.get_odds(1, 2025, 32)
+        assert response['results'] == 3
+        assert [item['path'] for item in response['response']][1:] == [
+            '/odds?league=1&season=2025&bookmaker=32&page=2',
+            '/odds?league=1&season=2025&bookmaker=32&page=3']
+
+    def test_single_page(self, stub):
+        assert stub.get_fixtures(1, 2025)['results'] == 1
+        assert stub.request_counter == {'fixtures': 1}
+
+
+class TestResponseCache:
+
+    @pytest.fixture
+    def cached(self, stub, tmp_path):
+        stub.cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+        return stub
+
+    def test_hit(self, cached):
+        first = cached.get_countries()
+        assert cached.get_countries() == first
+        assert cached.request_counter == {'countries': 1}
+        assert cached.cache_counter == {'countries': {'hit': 1, 'miss': 1, 'revalidated': 0}}
+
+    def test_params(self, cached):
+        cached.get_leagues('CO')
+        cached.get_leagues('AR')
+        assert cached.request_counter == {'leagues': 2}
+
+    def test_revalidate(self, cached):
+        cached.cache.ttl = {**cached.cache.ttl, 'countries': 0}
+        first = cached.get_countries()
+        assert cached.get_countries() == first
+        assert cached.request_counter == {'countries': 2}
+        assert cached.cache_counter['countries']['revalidated'] == 1
+
+    def test_uncached_endpoint(self, cached):
+        cached.cache.ttl = {}
+        cached.get_countries()
+        cached.get_countries()
+        assert cached.request_counter == {'countries': 2}
+        assert cached.cache_counter == {}
+
+    def test_errors_not_cached(self, cached):
+        cached.cache.ttl = {'errors': 60}
+        cached.fetch('errors')
+        cached.fetch('errors')
+        assert cached.request_counter == {'errors': 2}
+
+    def test_empty_not_cached(self, cached):
+        # statistics of a match not played yet come later
+        cached.cache.ttl = {'empty': 60}
+        assert cached.fetch('empty')['response'] == []
+        cached.fetch('empty')
+        assert cached.request_counter == {'empty': 2}
@@ -0,0 +1,75 @@
+import pytest
+from datetime import date, timedelta
+from unittest.mock import patch
+from extractor.apifootball.api_etl import ApiFootball, SYNC_AHEAD_DAYS, SYNC_PAST_DAYS
+from extractor.models import Fixture
+
+
+def fixtures_response(fixtures):
+    return {'response': [
+        {'fixture': {'id': fixture.id, 'date': fixture.date.isoformat(), 'periods': fixture.periods,
+                     'score': fixture.score, 'status': fixture.status, 'venue': {}},
+         'league': {'id': fixture.season.league_id, 'season': fixture.season.year},
+         'teams': {'home': {'id': fixture.home_team_id}, 'away': {'id': fixture.away_team_id}},
+         'goals': {'home': fixture.home_goals, 'away': fixture.away_goals}}
+        for fixture in fixtures]}
+
+
+@pytest.fixture
+def league(synthetic_league):
+    return synthetic_league(teams=6)
+
+
+@pytest.fixture
+def api(league):
+    api = ApiFootball(cache=False)
+    api.requests = []
+    current = list(Fixture.objects.filter(season__league=league, season__current=True)
+                   .select_related('season').order_by('date'))
+
+    def get_fixtures(league, season, **kwargs):
+        api.requests.append(kwargs)
+        return fixtures_response(current)
+
+    api.api.get_fixtures = get_fixtures
+    api.fixtures = current
+    return api
+
+
+class TestDeltaSync:
+
+    @pytest.mark.django_db
+    def test_window(self, api, league):
+        today = date(2025, 6, 15)
+        with patch('extractor.apifootball.api_etl.timezone.now') as now:
+            now.return_value.date.return_value = today
+            api.get_fixtures(league.id)
+        assert api.requests == [{'from': (today - timedelta(days=SYNC_PAST_DAYS)).isoformat(),
+                                 'to': (today + timedelta(days=SYNC_AHEAD_DAYS)).isoformat()}]
+
+    @pytest.mark.django_db
+    def test_backfill(self, api, league):
+        api.get_fixtures(league.id, backfill=True)
+        Fixture.objects.filter(season__league=league, season__current=True).delete()
+        api.get_fixtures(league.id)
+        assert api.requests == [{}, {}]
+        assert Fixture.objects.filter(season__league=league, season__current=True).count() == len(api.fixtures)
+
+    @pytest.mark.django_db
+    def test_changed_only(self, api, league, django_assert_max_num_queries):
+        # the season is resolved once, not per fixture
+        with django_assert_max_num_queries(6):
+            result = api.get_fixtures(league.id)
+        assert result['create'] == result['update'] == 0
+        assert result['unchanged'] == len(api.fixtures)
+        assert result['since'] is None
+
+        played = api.fixtures[-1]
+        played.home_goals, played.away_goals, played.status = 2, 0, {'short': 'FT'}
+        api.fixtures[0].periods = {'first': 1}
+        result = api.get_fixtures(league.id)
+        assert result['update'] == 2
+        assert result['unchanged'] == len(api.fixtures) - 2
+        # a change outside the results does not move the averages
+        assert result['since'] == played.date
+        assert Fixture.objects.get(id=played.id).status_short == 'FT'
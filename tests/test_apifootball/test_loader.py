@@ -1,6 +1,6 @@
 from extractor.models import Country
 import pytest
-from extractor.apifootball.api_loader import bulk_create_or_update
+from extractor.apifootball.api_loader import LOADER_METRICS, bulk_create_or_update
 
 
 @pytest.fixture
@@ -22,6 +22,32 @@ class TestCreateOrUpdate:
     @pytest.mark.django_db
     def test_update(self, countries):
         countries[0].save()
+        countries[0].name = 'USA'
         result = bulk_create_or_update(Country, countries, ['name'])
         assert result['update'] == 1
         assert result['create'] == len(countries[1:])
+        assert Country.objects.get(code='US').name == 'USA'
+
+    @pytest.mark.django_db
+    def test_changed_fields(self, countries):
+        bulk_create_or_update(Country, countries, ['name', 'flag'])
+        countries[0].name = 'USA'
+        result = bulk_create_or_update(Country, countries, ['name', 'flag'])
+        assert result['changed_fields'] == {'name': [countries[0].pk], 'flag': []}
+
+    @pytest.mark.django_db
+    def test_unchanged(self, countries, django_assert_num_queries):
+        bulk_create_or_update(Country, countries, ['name'])
+        countries[1].flag = 'canada.png'
+        # flag is not an update field, only the lookup query runs
+        with django_assert_num_queries(1):
+            result = bulk_create_or_update(Country, countries, ['name'])
+        assert result['unchanged'] == len(countries)
+        assert result['changed'] == []
+        assert Country.objects.get(code='CA').flag == 'ca.png'
+
+    @pytest.mark.django_db
+    def test_chunks(self, countries):
+        result = bulk_create_or_update(Country, countries, ['name'], chunk_size=1)
+        assert result['create'] == len(countries)
+        assert LOADER_METRICS['Country']['create'] >= len(countries)
@@ -1,6 +1,6 @@
 import pytest
-from extractor.apifootball.api_mapper import deep_get, mapper
-from extractor.models import Country, League, Season
+from extractor.apifootball.api_mapper import deep_get, map_all, mapper
+from extractor.models import Country, League, Season, Team, Venue
 
 
 class TestDeepGet:
@@ -79,3 +79,34 @@ class TestMapper:
         assert model.year == 2020
         assert model.start == '2020-01-01'
         assert model.league_id is None
+
+    @pytest.mark.django_db
+    def test_kwargs_precedence(self, league_response):
+        model = mapper(Season, league_response['response']['season'], id='1-2020')
+        assert model.id == '1-2020'
+
+
+class TestMapAll:
+
+    @pytest.fixture
+    def teams_response(self):
+        return [{
+            'team': {'id': team, 'name': f'team {team}', 'country': 'Spain'},
+            'venue': {'id': 10 if team % 2 else 99},
+            } for team in range(1, 7)]
+
+    @pytest.mark.django_db
+    def test_batched_relations(self, teams_response, django_assert_num_queries):
+        country = Country.objects.create(code='ES', name='Spain')
+        Venue.objects.create(id=10, name='venue', country=country)
+        with django_assert_num_queries(2):
+            models = map_all(Team, teams_response)
+        assert [model.id for model in models] == list(range(1, 7))
+        assert {model.country_id for model in models} == {'ES'}
+        assert [model.venue_id for model in models] == [10, None] * 3
+
+    @pytest.mark.django_db
+    def test_missing_keys(self):
+        model = mapper(Team, {'team': {'id': 1}})
+        assert model.name is None
+        assert model.country_id is None
@@ -1,7 +1,8 @@
 import pytest
 from datetime import datetime, timedelta
+from unittest.mock import patch
 from extractor.apifootball.api_mapper import mapper
-from extractor.models import Odds, Fixture, BookMaker, Bet
+from extractor.models import Odds, OddValues, Fixture, BookMaker, Bet, BetParameter
 
 
 class TestOdds:
@@ -58,3 +59,66 @@ class TestBets:
     def test_create_bookmakers(self, apifootball):
         response = apifootball.get_bets()
         assert response['create'] > 1 or response['update'] > 1
+
+
+class TestLoadOdds:
+
+    @pytest.fixture
+    def response(self):
+        return [
+            {'fixture': {'id': 1489365},
+             'bookmakers': [{'id': 32, 'bets': [
+                 {'id': 3, 'values': [
+                     {'value': 'Home', 'odd': '1.72'},
+                     {'value': 'Draw', 'odd': '3.45'},
+                     {'value': 'Away', 'odd': '5.00'}]},
+                 {'id': 999, 'values': [{'value': 'Yes', 'odd': '1.10'}]}]}]},
+            {'fixture': {'id': 1}, 'bookmakers': [{'id': 32, 'bets': [
+                {'id': 3, 'values': [{'value': 'Home', 'odd': '2.00'}]}]}]},
+            ]
+
+    @pytest.mark.django_db
+    def test_load_odds(self, bet, bookmaker, fixture, apifootball, response,
+                       django_assert_max_num_queries):
+        BetParameter.objects.create(id='3-Home', key='Home', bet=bet, prob_name='win')
+        with django_assert_max_num_queries(10):
+            result = apifootball.load_odds(response)
+        assert result['odds']['create'] == 1
+        assert result['values']['create'] == 3
+        assert OddValues.objects.get(key='Home').prob_name == 'win'
+        assert OddValues.objects.get(key='Away').value == 5.
+
+        response[0]['bookmakers'][0]['bets'][0]['values'][0]['odd'] = '1.80'
+        result = apifootball.load_odds(response)
+        assert result['values']['update'] == 1
+        assert result['values']['unchanged'] == 2
+        assert OddValues.objects.get(key='Home').value == 1.8
+
+    @pytest.mark.django_db
+    def test_surrogate_keys(self, bet, bookmaker, fixture, apifootball, response):
+        apifootball.load_odds(response)
+        odd = Odds.objects.get()
+        keys = dict(OddValues.objects.values_list('key', 'pk'))
+        assert isinstance(odd.pk, int)
+        assert set(OddValues.objects.values_list('odd', flat=True)) == {odd.pk}
+
+        response[0]['bookmakers'][0]['bets'][0]['values'][2]['odd'] = '4.50'
+        result = apifootball.load_odds(response)
+        assert result['odds']['unchanged'] == 1
+        assert Odds.objects.get().pk == odd.pk
+        assert dict(OddValues.objects.values_list('key', 'pk')) == keys
+        assert OddValues.objects.get(key='Away').value == 4.5
+
+    @pytest.mark.django_db
+    def test_concurrent_load(self, bet, bookmaker, fixture, apifootball, response):
+        # another load inserts the odd after this one looked the stored ones up
+        in_bulk = BookMaker.objects.in_bulk
+
+        def insert_first(*args, **kwargs):
+            Odds.objects.create(fixture=fixture, bookmaker=bookmaker, bet=bet)
+            return in_bulk(*args, **kwargs)
+
+        with patch.object(BookMaker.objects, 'in_bulk', insert_first):
+            apifootball.load_odds(response)
+        odd = Odds.objects.get()
+        assert set(OddValues.objects.values_list('odd', flat=True)) == {odd.pk}
@@ -0,0 +1,57 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from extractor.models import BetParameter, OddHistory, OddValues
+from extractor.odds_history import with_prices
+
+
+def odds_response(home, away):
+    return [{'fixture': {'id': 1489365}, 'bookmakers': [{'id': 32, 'bets': [
+        {'id': 3, 'values': [{'value': 'Home', 'odd': home}, {'value': 'Away', 'odd': away}]}]}]}]
+
+
+def load_at(apifootball, response, moment):
+    with patch('extractor.odds_history.timezone.now', return_value=moment):
+        return apifootball.load_odds(response)
+
+
+class TestOddHistory:
+
+    @pytest.fixture
+    def kickoff(self, fixture):
+        fixture.date = datetime(2025, 12, 1, 20, tzinfo=timezone.utc)
+        fixture.save()
+        return fixture.date
+
+    @pytest.mark.django_db
+    def test_changes_only(self, bet, bookmaker, fixture, apifootball, kickoff):
+        assert load_at(apifootball, odds_response('1.72', '5.00'), kickoff - timedelta(hours=3))['history'] == 2
+        assert load_at(apifootball, odds_response('1.72', '5.00'), kickoff - timedelta(hours=2))['history'] == 0
+        assert load_at(apifootball, odds_response('1.80', '5.00'), kickoff - timedelta(hours=1))['history'] == 1
+
+        # a new prob_name alone is not a price change, the parameter is
+        # stored without its signal so only the load relabels the value
+        BetParameter.objects.bulk_create([BetParameter(id='3-Home', key='Home', bet=bet, prob_name='win')])
+        assert load_at(apifootball, odds_response('1.80', '5.00'), kickoff)['history'] == 0
+        assert OddValues.objects.get(key='Home').prob_name == 'win'
+
+        home = OddValues.objects.get(key='Home')
+        assert list(home.history.order_by('captured_at').values_list('value', flat=True)) == [1.72, 1.8]
+        assert OddHistory.objects.count() == 3
+
+    @pytest.mark.django_db
+    def test_prices(self, bet, bookmaker, fixture, apifootball, kickoff):
+        load_at(apifootball, odds_response('1.72', '5.00'), kickoff - timedelta(hours=2))
+        load_at(apifootball, odds_response('1.90', '4.50'), kickoff)
+        load_at(apifootball, odds_response('2.50', '3.00'), kickoff + timedelta(minutes=30))
+
+        prices = {row.key: row for row in with_prices(at=kickoff - timedelta(hours=1))}
+        assert prices['Home'].value == 2.5
+        assert prices['Home'].kickoff_value == 1.9
+        assert prices['Home'].value_at == 1.72
+        assert prices['Away'].kickoff_value == 4.5
+
+    @pytest.mark.django_db
+    def test_no_price_before(self, bet, bookmaker, fixture, apifootball, kickoff):
+        load_at(apifootball, odds_response('1.72', '5.00'), kickoff + timedelta(minutes=5))
+        assert with_prices().get(key='Home').kickoff_value is None
@@ -0,0 +1,123 @@
+from datetime import datetime, timezone
+from math import exp, factorial
+import numpy as np
+import pytest
+from extractor.averages import calculate_league_avg
+from extractor.checks import check_shared_cache
+from extractor.models import Bet, BetParameter, Fixture, Prediction
+from extractor.poisson_f import fixture_qry, poisson_model, poisson_records, prob_names
+from extractor.poisson_np import PROB_COLUMNS, poisson_pmf, poisson_probs
+from extractor.predictions import refresh_predictions
+
+
+@pytest.fixture
+def league(synthetic_league):
+    league = synthetic_league(teams=6)
+    calculate_league_avg(league.id)
+    return league
+
+
+class TestPoissonNumpy:
+
+    def test_pmf(self):
+        pmf = poisson_pmf(np.array([0., 1.3, 2.7]), 10)
+        for row, expected in zip(pmf, (0., 1.3, 2.7)):
+            assert row == pytest.approx([expected ** k * exp(-expected) / factorial(k)
+                                         for k in range(11)])
+
+    def test_markets(self):
+        probs = poisson_probs(np.array([1.4]), np.array([0.9]))
+        assert probs['win'] + probs['lose'] + probs['draw'] == pytest.approx(1.)
+        assert probs['l_25'] == pytest.approx(1 - probs['al2'])
+        assert probs['o_05'] == pytest.approx(1 - probs['l0'] * probs['v0'])
+
+
+class TestBackendParity:
+
+    @pytest.mark.django_db
+    def test_parity(self, league):
+        sql = poisson_records(('id',), league=league.id, list_all=True, backend='sql')
+        numpy = poisson_records(('id',), league=league.id, list_all=True, backend='numpy')
+        assert not sql.empty
+        sql, numpy = sql.set_index('id').sort_index(), numpy.set_index('id').sort_index()
+        assert list(sql.index) == list(numpy.index)
+        # the SQL model cuts the score matrix at 8 goals
+        np.testing.assert_allclose(numpy[PROB_COLUMNS], sql[PROB_COLUMNS], atol=1e-4)
+
+    @pytest.mark.django_db
+    def test_unknown_backend(self, league):
+        with pytest.raises(ValueError):
+            poisson_records(league=league.id, backend='spark')
+
+
+class TestPredictions:
+
+    @pytest.mark.django_db
+    def test_refresh(self, league):
+        result = refresh_predictions(league.id)
+        assert result['stored'] == Prediction.objects.count() > 0
+
+        stored = poisson_records(('id',), league=league.id, list_all=True, backend='stored')
+        numpy = poisson_records(('id',), league=league.id, list_all=True, backend='numpy')
+        stored, numpy = stored.set_index('id').sort_index(), numpy.set_index('id').sort_index()
+        np.testing.assert_allclose(stored[PROB_COLUMNS], numpy[PROB_COLUMNS])
+
+    @pytest.mark.django_db
+    def test_refresh_scope(self, league):
+        refresh_predictions(league.id)
+        prediction = Prediction.objects.order_by('fixture__date').last()
+        Fixture.objects.filter(pk=prediction.pk).update(home_n=0)
+
+        result = refresh_predictions(fixtures=[prediction.pk])
+        assert result == {'stored': 0, 'removed': 1}
+        assert Prediction.objects.count() > 0
+
+    @pytest.mark.django_db
+    def test_overall_computed(self, league):
+        # nothing stored yet, the overall model does not read the predictions
+        assert not poisson_model(league=league.id, list_all=True, materialized=True).exists()
+        assert poisson_model(league=league.id, overall=True, list_all=True, materialized=True).exists()
+
+
+class TestKellyPath:
+
+    @pytest.mark.django_db
+    def test_columns(self, league):
+        full = poisson_model(league=league.id, list_all=True).values('id', 'win', 'l_25')
+        lean = poisson_model(league=league.id, list_all=True, columns=('win', 'l_25'))
+        assert not {'draw', 'lose', 'o_05', 'v_25'} & set(lean.query.annotations)
+        assert list(lean.values('id', 'win', 'l_25').order_by('id')) == \
+            pytest.approx(list(full.order_by('id')))
+
+    @pytest.mark.django_db
+    def test_prob_names(self, league, django_assert_num_queries):
+        bet = Bet.objects.create(id=1, name='Match Winner')
+        for key, name in (('Home', 'win'), ('Away', 'lose'), ('Home/Draw', 'win'), ('Other', '')):
+            BetParameter.objects.create(id=f'1-{key}', key=key, bet=bet, prob_name=name)
+        assert prob_names() == ('win', 'lose')
+        with django_assert_num_queries(0):
+            prob_names()
+        BetParameter.objects.filter(pk='1-Away').get().delete()
+        assert prob_names() == ('win',)
+
+    def test_shared_cache(self, settings):
+        settings.DEBUG = False
+        assert [error.id for error in check_shared_cache(None)] == ['extractor.W001']
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        assert check_shared_cache(None) == []
+
+
+class TestStatusShort:
+
+    @pytest.mark.django_db
+    def test_save(self, league):
+        fixture = Fixture.objects.filter(status_short='NS').first()
+        fixture.status = {'short': '1H', 'elapsed': 12}
+        fixture.save()
+        assert Fixture.objects.get(pk=fixture.pk).status_short == '1H'
+
+    @pytest.mark.django_db
+    def test_model_filter(self, league):
+        window = (datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2026, 1, 1, tzinfo=timezone.utc))
+        ids = set(fixture_qry(window, league.id).values_list('id', flat=True))
+        assert ids and ids <= set(Fixture.objects.filter(status_short='NS').values_list('id', flat=True))
@@ -0,0 +1,188 @@
+import pytest
+from unittest.mock import patch
+from datetime import datetime, timedelta, timezone
+from extractor.apifootball.api_etl import ApiFootball
+from extractor.models import Bet, BookMaker, Fixture, OddValues, Prediction
+from extractor.tasks import poll_fixtures
+from extractor.polling import POLL_CLAIM_SECONDS, claim_due, poll, poll_interval
+
+NOW = datetime(2025, 12, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeApi:
+
+    def __init__(self):
+        self.refreshed, self.odds = [], []
+
+    def refresh_fixtures(self, ids):
+        self.refreshed.extend(ids)
+        Fixture.objects.filter(id__in=ids).update(status={'short': 'FT'}, status_short='FT')
+        return {'create': 0, 'update': len(ids), 'since': {}}
+
+    def get_fixture_odds(self, fixtures, bookmakers):
+        self.days = list(fixtures)
+        self.odds.extend((fixture, bookmaker) for wanted in fixtures.values()
+                         for fixture in wanted for bookmaker in bookmakers)
+        return {'requests': len(fixtures), 'odds': 0, 'values': 0, 'history': 0}
+
+
+@pytest.fixture
+def schedule(synthetic_league):
+    '''the fixtures to play moved around NOW, one in play'''
+    league = synthetic_league(teams=8)
+    BookMaker.objects.create(id=32, name='bookmaker', sync_on=True)
+    BookMaker.objects.create(id=8, name='other')
+    upcoming = list(Fixture.objects.filter(season__league=league, status_short='NS').order_by('id'))
+    kickoffs = {'live': NOW - timedelta(minutes=30), 'match_day': NOW + timedelta(hours=3),
+                'week': NOW + timedelta(days=3), 'far': NOW + timedelta(days=30)}
+    for fixture, kickoff in zip(upcoming, kickoffs.values()):
+        fixture.date = kickoff
+        fixture.status = {'short': '1H' if kickoff < NOW else 'NS'}
+        fixture.save()
+    return {name: fixture.id for name, fixture in zip(kickoffs, upcoming)}
+
+
+class TestPollInterval:
+
+    @pytest.mark.parametrize('kickoff, status, expected', [
+        (NOW + timedelta(hours=1), '2H', timedelta(minutes=1)),
+        (NOW - timedelta(minutes=1), 'NS', timedelta(minutes=1)),
+        (NOW + timedelta(hours=3), 'NS', timedelta(minutes=5)),
+        (NOW + timedelta(minutes=2), 'NS', timedelta(minutes=2)),
+        (NOW + timedelta(days=3), 'NS', timedelta(hours=1)),
+        (NOW + timedelta(hours=24, minutes=20), 'NS', timedelta(minutes=20)),
+        (NOW + timedelta(days=10), 'TBD', timedelta(days=3)),
+        ])
+    def test_interval(self, kickoff, status, expected):
+        assert poll_interval(kickoff, status, NOW) == expected
+
+
+class TestPoll:
+
+    @pytest.mark.django_db
+    def test_due_only(self, schedule):
+        api = FakeApi()
+        result = poll(api, NOW)
+        assert result == {'due': 3, 'live': 1, 'upcoming': 2, 'fixtures': 1, 'since': {},
+                          'odds': {'requests': 2, 'odds': 0, 'values': 0, 'history': 0}}
+        assert api.refreshed == [schedule['live']]
+        assert sorted(api.odds) == sorted([(schedule['match_day'], 32), (schedule['week'], 32)])
+        assert sorted(api.days) == [(1, 2025, '2025-12-01'), (1, 2025, '2025-12-04')]
+
+        next_poll = dict(Fixture.objects.filter(id__in=schedule.values()).values_list('id', 'next_poll_at'))
+        assert next_poll[schedule['match_day']] == NOW + timedelta(minutes=5)
+        assert next_poll[schedule['week']] == NOW + timedelta(hours=1)
+        assert next_poll[schedule['far']] is None
+
+    @pytest.mark.django_db
+    def test_not_due(self, schedule):
+        poll(FakeApi(), NOW)
+        api = FakeApi()
+        assert poll(api, NOW + timedelta(minutes=2))['due'] == 0
+        assert not api.refreshed and not api.odds
+
+        # the finished fixture left the due set, the match day one is due again
+        result = poll(api, NOW + timedelta(minutes=5))
+        assert api.odds == [(schedule['match_day'], 32)]
+        assert result['live'] == 0
+
+    @pytest.mark.django_db
+    def test_claimed(self, schedule):
+        claimed = claim_due(NOW)
+        assert len(claimed) == 3
+        # a round starting while the first one still fetches finds nothing
+        assert poll(FakeApi(), NOW + timedelta(minutes=1))['due'] == 0
+        assert Fixture.objects.get(id=schedule['week']).next_poll_at == NOW + timedelta(seconds=POLL_CLAIM_SECONDS)
+
+
+class TestRefreshFixtures:
+
+    @pytest.mark.django_db
+    def test_chunks(self, synthetic_league):
+        league = synthetic_league(teams=6)
+        ids = list(Fixture.objects.filter(season__league=league).order_by('id').values_list('id', flat=True))[:25]
+        fixtures = Fixture.objects.in_bulk(ids)
+        requested = []
+
+        def get_fixtures_by_id(chunk):
+            requested.append(len(chunk))
+            return {'response': [
+                {'fixture': {'id': id, 'date': fixtures[id].date.isoformat(), 'periods': {}, 'score': {},
+                             'status': {'short': 'FT'}, 'venue': {}},
+                 'league': {'id': league.id, 'season': 2025},
+                 'teams': {'home': {'id': fixtures[id].home_team_id}, 'away': {'id': fixtures[id].away_team_id}},
+                 'goals': {'home': 1, 'away': 1}} for id in chunk]}
+
+        api = ApiFootball(cache=False)
+        api.api.get_fixtures_by_id = get_fixtures_by_id
+        result = api.refresh_fixtures(ids)
+        assert sorted(requested) == [5, 20]
+        assert result['create'] == 0
+        assert result['since'] == {league.id: min(fixture.date for fixture in fixtures.values())}
+        assert Fixture.objects.filter(id__in=ids, status_short='FT', home_goals=1).count() == 25
+        assert Fixture.objects.get(id=ids[0]).season.league == league
+
+
+class TestFixtureOdds:
+
+    @pytest.mark.django_db
+    def test_day_pages(self, schedule):
+        Bet.objects.create(id=1, name='Match Winner')
+        wanted, other = schedule['match_day'], schedule['week']
+        requested = []
+
+        def get_date_odds(league, season, date):
+            requested.append((league, season, date))
+            return {'paging': {'current': 1, 'total': 1}, 'response': [
+                {'fixture': {'id': fixture}, 'bookmakers': [
+                    {'id': bookmaker, 'bets': [{'id': 1, 'values': [{'value': 'Home', 'odd': '2.10'}]}]}
+                    for bookmaker in (32, 8)]}
+                for fixture in (wanted, other)]}
+
+        api = ApiFootball(cache=False)
+        api.api.get_date_odds = get_date_odds
+        result = api.get_fixture_odds({(1, 2025, '2025-12-01'): {wanted}}, [32])
+        assert requested == [(1, 2025, '2025-12-01')]
+        assert result == {'requests': 1, 'odds': 1, 'values': 1, 'history': 1}
+        assert list(OddValues.objects.values_list('odd__fixture', 'odd__bookmaker')) == [(wanted, 32)]
+
+
+class TestPollTask:
+
+    @pytest.mark.django_db
+    def test_results_reach_predictions(self, schedule):
+        live = Fixture.objects.get(id=schedule['live'])
+        played = Fixture.objects.filter(season=live.season, home_goals__isnull=False).count()
+
+        def refresh_fixtures(api, ids):
+            Fixture.objects.filter(id__in=ids).update(
+                status={'short': 'FT'}, status_short='FT', home_goals=3, away_goals=0)
+            return {'create': 0, 'update': len(ids), 'since': {live.season.league_id: live.date}}
+
+        with patch.object(ApiFootball, 'refresh_fixtures', refresh_fixtures), \
+                patch.object(ApiFootball, 'get_fixture_odds', return_value={}), \
+                patch('extractor.polling.timezone.now', return_value=NOW):
+            result = poll_fixtures()
+        assert 'since' not in result
+        # averages from the live result on, the fixtures after it see one more match
+        later = Fixture.objects.filter(season=live.season, date__gt=live.date).first()
+        assert later.league_n == played + 1
+        assert Prediction.objects.filter(fixture__season=live.season).exists()
+
+    @pytest.mark.django_db
+    def test_bump_on_changes(self, schedule):
+        # nothing stored, the versioned caches are kept
+        with patch.object(ApiFootball, 'refresh_fixtures', return_value={'create': 0, 'update': 0, 'since': {}}), \
+                patch.object(ApiFootball, 'get_fixture_odds',
+                             return_value={'requests': 2, 'odds': 0, 'values': 0, 'history': 0}), \
+                patch('extractor.polling.timezone.now', return_value=NOW), \
+                patch('extractor.tasks.bump_data_version') as bump:
+            assert poll_fixtures()['due'] == 3
+            bump.assert_not_called()
+
+            with patch.object(ApiFootball, 'get_fixture_odds',
+                              return_value={'requests': 1, 'odds': 0, 'values': 2, 'history': 1}), \
+                    patch('extractor.polling.timezone.now', return_value=NOW + timedelta(hours=2)):
+                poll_fixtures()
+            bump.assert_called_once()
+
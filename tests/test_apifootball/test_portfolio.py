@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from extractor.poisson_np import poisson_pmf, poisson_probs
+from extractor.portfolio import optimize_kelly, outcome_mask
+
+
+def candidates(*bets, l_expected=1.6, v_expected=1.1):
+    return pd.DataFrame([{'fixture': fixture, 'prob_name': name, 'value': value,
+                          'l_expected': l_expected, 'v_expected': v_expected}
+                         for fixture, name, value in bets])
+
+
+class TestOptimizeKelly:
+
+    def test_single_bet(self):
+        prob = poisson_probs(np.array([1.6]), np.array([1.1]))['win'][0]
+        stakes = optimize_kelly(candidates((1, 'win', 1.5)))
+        assert stakes.iloc[0] == pytest.approx((prob * 2.5 - 1) / 1.5, abs=1e-6)
+
+    def test_outcome_masks(self):
+        probs = poisson_probs(np.array([1.6]), np.array([1.1]))
+        grid = (poisson_pmf(np.array([1.6]))[0][:, None] * poisson_pmf(np.array([1.1]))[0][None, :])
+        for name in ('win', 'lose', 'draw', 'o_05', 'l3', 'av2', 'l_25', 'v_15', 'l_over'):
+            assert grid[outcome_mask(name)].sum() == pytest.approx(probs[name][0], abs=1e-9), name
+
+    def test_same_fixture(self):
+        # the same market twice must not be staked twice
+        single = optimize_kelly(candidates((1, 'win', 1.5)))
+        double = optimize_kelly(candidates((1, 'win', 1.5), (1, 'win', 1.5)))
+        assert double.sum() == pytest.approx(single.sum(), abs=1e-6)
+
+    def test_joint_wealth(self):
+        # two independent fixtures are staked against one bankroll, less than alone
+        prob = poisson_probs(np.array([1.6]), np.array([1.1]))['win'][0]
+        single = optimize_kelly(candidates((1, 'win', 1.5))).iloc[0]
+        stakes = optimize_kelly(candidates((1, 'win', 1.5), (2, 'win', 1.5)))
+        grid = np.linspace(0, .49, 49001)
+        growth = (prob ** 2 * np.log(1 + 3 * grid) + 2 * prob * (1 - prob) * np.log(1 + .5 * grid)
+                  + (1 - prob) ** 2 * np.log(1 - 2 * grid))
+        assert stakes.tolist() == pytest.approx([grid[growth.argmax()]] * 2, abs=1e-4)
+        assert stakes.iloc[0] < single
+
+    def test_sampled(self):
+        bets = candidates(*[(fixture, 'win', 1.5) for fixture in range(10)])
+        exact = optimize_kelly(bets)
+        sampled = optimize_kelly(bets, scenarios=512, rng=1)
+        assert sampled.sum() == pytest.approx(exact.sum(), rel=.1)
+        assert (optimize_kelly(bets, scenarios=512, rng=1) == sampled).all()
+
+    def test_budget_and_factor(self):
+        bets = candidates(*[(fixture, 'o_05', 1.) for fixture in range(10)])
+        stakes = optimize_kelly(bets, budget=.5)
+        assert stakes.sum() == pytest.approx(.5)
+        assert optimize_kelly(bets, budget=.5, factor=.5).sum() == pytest.approx(.25)
+
+    def test_no_edge(self):
+        assert optimize_kelly(candidates((1, 'draw', 1.))).sum() == 0
+        assert optimize_kelly(candidates()).empty
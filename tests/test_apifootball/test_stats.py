@@ -0,0 +1,52 @@
+import pytest
+from extractor.apifootball.api_etl import ApiFootball
+from extractor.models import Fixture, Stats
+
+
+def statistics(fixture):
+    return {'response': [
+        {'team': {'id': team}, 'statistics': [{'type': 'Fouls', 'value': fixture.id % 7}]}
+        for team in (fixture.home_team_id, fixture.away_team_id)]}
+
+
+@pytest.fixture
+def league(synthetic_league):
+    return synthetic_league(teams=4)
+
+
+@pytest.fixture
+def api(league):
+    api = ApiFootball(cache=False)
+    fixtures = Fixture.objects.in_bulk()
+    api.api.get_fixture_stats = lambda fixture: statistics(fixtures[fixture])
+    return api
+
+
+class TestFixtureStats:
+
+    @pytest.mark.django_db
+    def test_batches(self, api, league):
+        finished = Fixture.objects.filter(season__league=league, season__current=True,
+                                          home_goals__isnull=False)
+        result = api.get_fixture_stats(league.id, batch_size=2)
+        assert result['after'] is None
+        assert result['create'] == result['fixtures'] == finished.count()
+        assert Stats.objects.count() == finished.count()
+
+    @pytest.mark.django_db
+    def test_resume(self, api, league):
+        first = api.get_fixture_stats(league.id, batch_size=2, max_batches=1)
+        assert first['fixtures'] == 2
+        assert Stats.objects.filter(fixture__id__lte=first['after']).count() == 2
+
+        api.api.get_fixture_stats = lambda fixture: {'response': []}
+        empty = api.get_fixture_stats(league.id, first['after'], batch_size=2, max_batches=1)
+        assert empty['create'] == 0 and empty['after'] > first['after']
+        assert Stats.objects.count() == 2
+
+    @pytest.mark.django_db
+    def test_backfill(self, api, league):
+        current = api.get_fixture_stats(league.id)['create']
+        past = api.get_fixture_stats(league.id, backfill=True)['create']
+        assert past == Fixture.objects.filter(season__year=2024).count()
+        assert Stats.objects.count() == current + past
@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import patch
+from extractor.models import Fixture, Prediction
+from extractor.tasks import (finish_sync_fixtures, finish_sync_odds, sync_fixtures, sync_league_fixtures,
+                             sync_league_odds)
+
+
+@pytest.fixture
+def league(synthetic_league):
+    return synthetic_league(teams=4)
+
+
+class TestFinishSyncFixtures:
+
+    @pytest.mark.django_db
+    def test_full(self, league):
+        finish_sync_fixtures([{'league': league.id, 'full': True, 'since': None}])
+        assert not Fixture.objects.filter(season__league=league, league_n__isnull=True).exists()
+        assert Prediction.objects.filter(fixture__season__league=league).exists()
+
+    @pytest.mark.django_db
+    def test_unchanged(self, league):
+        finish_sync_fixtures([{'league': league.id, 'full': False, 'since': None}])
+        assert not Fixture.objects.filter(season__league=league, league_n__isnull=False).exists()
+        assert not Prediction.objects.exists()
+
+
+class TestSyncFixtures:
+
+    @pytest.mark.django_db
+    def test_returns_group(self, league):
+        with patch('extractor.tasks.chord') as chord:
+            group_id = sync_fixtures()
+        header = chord.return_value.return_value.parent
+        # the header group is followed by sync_progress, not the callback
+        header.save.assert_called_once()
+        assert group_id == header.id
+
+
+class TestSyncLeagueFixtures:
+
+    @pytest.mark.django_db
+    def test_stats_enqueued(self, league):
+        saved = {'create': 0, 'update': 0, 'since': None}
+        with patch('extractor.tasks.ApiFootball.get_fixtures', return_value=saved), \
+                patch('extractor.tasks.ApiFootball.get_fixture_stats') as inline, \
+                patch('extractor.tasks.sync_fixture_stats.delay') as delay:
+            sync_league_fixtures(league.id, sync_stats=True, backfill=True)
+        inline.assert_not_called()
+        delay.assert_called_once_with(league.id, None, True)
+
+
+class TestSyncOdds:
+
+    @pytest.mark.django_db
+    def test_bump_once(self):
+        with patch('extractor.tasks.ApiFootball.get_odds', return_value={'odds': 1}), \
+                patch('extractor.tasks.bump_data_version') as bump:
+            results = [sync_league_odds(1, '1-2025', bookmaker) for bookmaker in (8, 32)]
+            bump.assert_not_called()
+            assert finish_sync_odds(results) == results
+        bump.assert_called_once()
+
@@ -0,0 +1,29 @@
+from time import perf_counter
+import logging
+import pytest
+from extractor.apifootball.api_etl import calculate_avg
+from extractor.averages import calculate_league_avg
+from extractor.models import Fixture
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.benchmark
+
+
+class TestAveragesBenchmark:
+
+    @pytest.mark.django_db
+    def test_bulk_vs_per_fixture(self, synthetic_league):
+        league = synthetic_league(teams=12)
+
+        start = perf_counter()
+        for fixture in Fixture.objects.filter(season__league=league):
+            calculate_avg(fixture)
+        per_fixture = perf_counter() - start
+
+        start = perf_counter()
+        calculate_league_avg(league.id)
+        bulk = perf_counter() - start
+
+        logger.info(f'per fixture: {per_fixture:.3f}s, bulk: {bulk:.3f}s, '
+                    f'speed-up: {per_fixture / bulk:.1f}x')
@@ -0,0 +1,28 @@
+from time import perf_counter
+import logging
+import pytest
+from extractor.averages import calculate_league_avg
+from extractor.poisson_f import poisson_records
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.benchmark
+
+
+class TestPoissonBenchmark:
+
+    @pytest.mark.django_db
+    def test_sql_vs_numpy(self, synthetic_league):
+        league = synthetic_league(teams=20)
+        calculate_league_avg(league.id)
+
+        timings = {}
+        for backend in ('sql', 'numpy'):
+            start = perf_counter()
+            df = poisson_records(('id',), league=league.id, list_all=True, backend=backend)
+            timings[backend] = perf_counter() - start
+            assert not df.empty
+
+        logger.info(f'{len(df)} fixtures, sql: {timings["sql"]:.3f}s, '
+                    f'numpy: {timings["numpy"]:.3f}s, '
+                    f'speed-up: {timings["sql"] / timings["numpy"]:.1f}x')
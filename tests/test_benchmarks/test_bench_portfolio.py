@@ -0,0 +1,32 @@
+from time import perf_counter
+import logging
+import numpy as np
+import pandas as pd
+import pytest
+from extractor.portfolio import optimize_kelly
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.benchmark
+
+
+class TestPortfolioBenchmark:
+
+    @pytest.mark.parametrize('size', [100, 500])
+    def test_optimizer(self, size):
+        rng = np.random.default_rng(0)
+        fixtures = size // 3
+        df = pd.DataFrame({
+            'fixture': rng.integers(0, fixtures, size),
+            'prob_name': rng.choice(['win', 'draw', 'lose', 'l_15', 'v_15', 'o_05', 'al1'], size),
+            'value': rng.uniform(.5, 4, size)})
+        df['l_expected'] = df.fixture.map(dict(enumerate(rng.uniform(.5, 2.5, fixtures))))
+        df['v_expected'] = df.fixture.map(dict(enumerate(rng.uniform(.5, 2., fixtures))))
+
+        start = perf_counter()
+        stakes = optimize_kelly(df)
+        elapsed = perf_counter() - start
+
+        assert 0 < stakes.sum() <= 1. + 1e-9
+        logger.info(f'{size} bets on {fixtures} fixtures, optimizer: {elapsed:.3f}s, '
+                    f'{(stakes > 0).sum()} staked')
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from django.test import Client
+import pytest
+from extractor.cache import bump_data_version
+from extractor.models import Bet, BetParameter
+
+
+@pytest.fixture
+def client():
+    return Client()
+
+
+class TestViewCache:
+
+    @pytest.mark.django_db
+    def test_next_table(self, client, django_assert_num_queries):
+        first = client.get('/front/next_table/')
+        assert first.status_code == 200
+        with django_assert_num_queries(0):
+            cached = client.get('/front/next_table/')
+        assert cached.content == first.content
+
+        bump_data_version()
+        with django_assert_num_queries(1):
+            client.get('/front/next_table/')
+
+    @pytest.mark.django_db
+    def test_params(self, client, django_assert_num_queries):
+        client.get('/front/next_table/')
+        with django_assert_num_queries(1):
+            client.get('/front/next_table/', {'page': 2})
+
+
+class TestBetsTable:
+
+    @pytest.mark.django_db
+    def test_no_bets(self, client):
+        bet = Bet.objects.create(id=1, name='Match Winner')
+        BetParameter.objects.create(id='1-Home', key='Home', bet=bet, prob_name='win')
+        response = client.get('/front/bets_table/', {'bet': '5000'})
+        assert response.status_code == 200
+        assert response.context['total'] == 0
+
+
+class TestWidget:
+
+    @pytest.mark.django_db
+    def test_window_by_day(self, client):
+        windows = []
+
+        def kelly_function(date_filter, **kwargs):
+            windows.append(date_filter)
+            return Bet.objects.none()
+
+        day = datetime(2025, 12, 1, 12, tzinfo=timezone.utc)
+        with patch('extractor.views.kelly_function', kelly_function):
+            for moment in (day, day + timedelta(hours=1), day + timedelta(days=1)):
+                with patch('extractor.views.now', return_value=moment):
+                    assert client.get('/').status_code == 200
+        # the second request of the day is served from the cache
+        assert [start for start, _ in windows] == [day - timedelta(90), day + timedelta(1) - timedelta(90)]
+